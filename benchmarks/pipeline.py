@@ -0,0 +1,415 @@
+"""Synthetic load benchmark for the trigger pipeline
+
+Drives the ActionExecutor listeners with generated message, reaction and
+member events against a fake Discord HTTP layer, for every combination of
+the grid parameters, and writes one JSON object per line with the results.
+
+    python -m benchmarks.pipeline --guilds 1,50 --triggers 10,200 \\
+        --complexity literal,regex --actions 1,3 --output results.jsonl
+
+Uses a temporary SQLite database by default. Another database can be given
+with --db-uri together with --reset, its triggers and actions tables are
+dropped and recreated for every cell of the grid.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import platform
+import subprocess
+import tempfile
+from statistics import quantiles
+from types import SimpleNamespace
+
+import discord
+
+from bot import db
+from bot.budgets import ExecutionBudgets
+from bot.cogs.action_executor import ActionExecutor
+from bot.db import models
+from bot.enums import ActionType, TriggerType
+from bot.execution import SendScheduler
+from bot.patterns import analyse_pattern
+from bot.registry import trigger_registry
+
+PATTERNS = {
+    "literal": lambda i: f"hello {i}",
+    "prefix": lambda i: rf"!cmd{i} \w+",
+    "regex": lambda i: rf"(?:foo|bar){i}\d+.*baz",
+}
+MATCHING_CONTENT = {
+    "literal": lambda i: f"hello {i}",
+    "prefix": lambda i: f"!cmd{i} go",
+    "regex": lambda i: f"foo{i}42 and baz",
+}
+CHANNELS_PER_GUILD = 5
+EMOJIS = ("👍", "🎉", "🔥")
+
+
+class FakeChannel(discord.TextChannel):
+    """Text channel whose send() only counts messages instead of calling Discord"""
+
+    def __init__(self, channel_id: int, guild):
+        self.id = channel_id
+        self.guild = guild  # type: ignore
+        self.name = f"channel-{channel_id}"
+        self.sent = 0
+
+    async def send(self, content: str):  # type: ignore
+        self.sent += 1
+
+
+class FakeGuild:
+    """Guild whose members are all made up on request"""
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+    def get_member(self, member_id: int) -> SimpleNamespace:
+        return fake_member(member_id, self)
+
+    async def fetch_member(self, member_id: int) -> SimpleNamespace:
+        return fake_member(member_id, self)
+
+
+class FakeBot:
+    """The parts of commands.Bot that the action executor uses"""
+
+    def __init__(self):
+        self.channels: dict[int, FakeChannel] = {}
+
+    def get_channel(self, channel_id: int) -> FakeChannel:
+        # Channels that weren't set up, e.g. the target of an action,
+        # are created on first use so every send is counted.
+        if (channel := self.channels.get(channel_id)) is None:
+            channel = self.channels[channel_id] = FakeChannel(
+                channel_id, FakeGuild(0)
+            )
+
+        return channel
+
+
+def fake_member(member_id: int, guild) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=member_id, guild=guild, mention=f"<@{member_id}>"
+    )
+
+
+def channel_id(guild_id: int, index: int) -> int:
+    return guild_id * 1000 + index
+
+
+async def populate(guilds: int, triggers: int, complexity: str, actions: int):
+    """Writes the triggers and actions of one grid cell to a fresh database"""
+
+    async with db.get_engine().begin() as connection:
+        await connection.run_sync(models.Base.metadata.drop_all)
+        await connection.run_sync(models.Base.metadata.create_all)
+
+    trigger_id = action_id = 0
+    rows: list = []
+
+    for guild_id in range(1, guilds + 1):
+        for i in range(triggers):
+            trigger_id += 1
+            channel = channel_id(guild_id, i % CHANNELS_PER_GUILD)
+
+            # Split the guild's triggers between the three kinds of events
+            if i % 3 == 0:
+                trigger_type = TriggerType.Message
+                pattern = PATTERNS[complexity](i)
+                analysis = analyse_pattern(pattern)
+                trigger = models.Trigger(
+                    id=trigger_id,
+                    guild_id=guild_id,
+                    type=trigger_type,
+                    activation_params={
+                        "match_statement": pattern,
+                        "channel_id": channel,
+                    },
+                    match_kind=analysis.kind,
+                    match_cost=analysis.cost,
+                )
+            elif i % 3 == 1:
+                trigger_type = TriggerType.ReactionAdd
+                trigger = models.Trigger(
+                    id=trigger_id,
+                    guild_id=guild_id,
+                    type=trigger_type,
+                    activation_params={
+                        "channel_id": channel,
+                        "message_id": trigger_id,
+                        "emoji": EMOJIS[i % len(EMOJIS)] if i % 2 else None,
+                    },
+                )
+            else:
+                trigger_type = TriggerType.MemberJoin
+                trigger = models.Trigger(
+                    id=trigger_id,
+                    guild_id=guild_id,
+                    type=trigger_type,
+                    activation_params={"member_id": None},
+                )
+
+            rows.append(trigger)
+
+            for _ in range(actions):
+                action_id += 1
+                rows.append(
+                    models.Action(
+                        id=action_id,
+                        guild_id=guild_id,
+                        type=ActionType.MessageSend,
+                        action_params={
+                            "message_content": "{member_mention} triggered {trigger_type}",
+                            "channel_id": channel,
+                        },
+                        trigger=trigger,
+                    )
+                )
+
+    async with db.async_session() as session:
+        session.add_all(rows)
+        await session.commit()
+
+
+def make_events(args, guilds: int, triggers: int, complexity: str, rng):
+    """Generates message, reaction and member events in turn, of which roughly match_rate match a trigger"""
+
+    events = []
+
+    for n in range(args.events):
+        guild_id = rng.randint(1, guilds)
+        guild = SimpleNamespace(id=guild_id)
+        matching = rng.random() < args.match_rate
+        kind = n % 3
+
+        # Message, reaction and member triggers take turns within a guild
+        candidates = range(kind, triggers, 3)
+        i = rng.choice(candidates) if candidates else kind
+        matching = matching and bool(candidates)
+
+        if kind == 0:
+            channel = SimpleNamespace(
+                id=channel_id(guild_id, i % CHANNELS_PER_GUILD),
+                mention=f"<#{channel_id(guild_id, i % CHANNELS_PER_GUILD)}>",
+            )
+            content = (
+                MATCHING_CONTENT[complexity](i)
+                if matching
+                else f"just chatting {n}"
+            )
+            message = SimpleNamespace(
+                guild=guild,
+                channel=channel,
+                content=content,
+                author=fake_member(n, guild),
+            )
+            events.append(("message", message))
+        elif kind == 1:
+            trigger_id = (guild_id - 1) * triggers + i + 1
+            payload = discord.RawReactionActionEvent(
+                {
+                    "message_id": trigger_id if matching else 0,
+                    "channel_id": channel_id(guild_id, i % CHANNELS_PER_GUILD),
+                    "user_id": n,
+                    "guild_id": guild_id,
+                },  # type: ignore
+                discord.PartialEmoji(name=rng.choice(EMOJIS)),
+                "REACTION_ADD",
+            )
+            payload.member = fake_member(n, guild)  # type: ignore
+            events.append(("reaction", payload))
+        else:
+            events.append(("member", fake_member(n, guild)))
+
+    return events
+
+
+async def run_cell(
+    args, guilds: int, triggers: int, complexity: str, actions: int
+):
+    await populate(guilds, triggers, complexity, actions)
+    await trigger_registry.load()
+
+    bot = FakeBot()
+    executor = ActionExecutor(bot)  # type: ignore
+    # No pacing, only the pipeline itself is being measured
+    executor.send_scheduler = SendScheduler(
+        rate=10**9, per=1.0, max_pending=10**9
+    )
+    executor.budgets = ExecutionBudgets()
+
+    for guild_id in range(1, guilds + 1):
+        guild = SimpleNamespace(id=guild_id)
+
+        for index in range(CHANNELS_PER_GUILD):
+            channel = FakeChannel(channel_id(guild_id, index), guild)
+            bot.channels[channel.id] = channel
+
+    listeners = {
+        "message": executor.on_message,
+        "reaction": executor.on_raw_reaction_add,
+        "member": executor.on_member_join,
+    }
+    rng = random.Random(args.seed)
+    events = make_events(args, guilds, triggers, complexity, rng)
+
+    # Warm up the matcher caches and compiled patterns
+    for kind, event in events[: min(len(events), 100)]:
+        await listeners[kind](event)
+
+    await executor.action_queue.join()
+    await executor.send_scheduler.join()
+
+    latencies: dict[str, list[float]] = {kind: [] for kind in listeners}
+    executed_before = sum(c.sent for c in bot.channels.values())
+    start = time.perf_counter()
+
+    for kind, event in events:
+        event_start = time.perf_counter()
+        await listeners[kind](event)
+        latencies[kind].append(time.perf_counter() - event_start)
+
+    await executor.action_queue.join()
+
+    await executor.send_scheduler.join()
+
+    elapsed = time.perf_counter() - start
+    executor.cog_unload()
+    sent = sum(c.sent for c in bot.channels.values()) - executed_before
+
+    all_latencies = list(itertools.chain(*latencies.values()))
+    result = {
+        "guilds": guilds,
+        "triggers_per_guild": triggers,
+        "complexity": complexity,
+        "actions_per_trigger": actions,
+        "events": len(events),
+        "seconds": round(elapsed, 4),
+        "events_per_second": round(len(events) / elapsed, 1),
+        "messages_sent": sent,
+        **latency_stats(all_latencies, ""),
+    }
+
+    for kind, values in latencies.items():
+        result.update(latency_stats(values, f"{kind}_"))
+
+    return result
+
+
+def latency_stats(values: list[float], prefix: str) -> dict:
+    if len(values) < 2:
+        return {}
+
+    percentiles = quantiles(values, n=100, method="inclusive")
+    return {
+        f"{prefix}p50_ms": round(percentiles[49] * 1000, 4),
+        f"{prefix}p99_ms": round(percentiles[98] * 1000, 4),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int_list, default=[1, 10])
+    parser.add_argument("--triggers", type=int_list, default=[10, 100])
+    parser.add_argument(
+        "--complexity",
+        type=lambda v: v.split(","),
+        default=list(PATTERNS),
+        help=f"comma separated, any of {', '.join(PATTERNS)}",
+    )
+    parser.add_argument("--actions", type=int_list, default=[1])
+    parser.add_argument("--events", type=int, default=3000)
+    parser.add_argument(
+        "--match-rate",
+        type=float,
+        default=0.1,
+        help="fraction of events that match a trigger",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db-uri",
+        help="database to run against, a temporary SQLite file by default",
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="confirm that --db-uri's triggers and actions tables may be dropped",
+    )
+    parser.add_argument(
+        "--output", help="file to append JSON lines to, stdout by default"
+    )
+    args = parser.parse_args(argv)
+
+    if unknown := set(args.complexity) - PATTERNS.keys():
+        parser.error(f"unknown complexity {', '.join(sorted(unknown))}")
+
+    if args.db_uri and not args.reset:
+        parser.error(
+            "--db-uri's triggers and actions tables are dropped, pass --reset to confirm"
+        )
+
+    return args
+
+
+async def run(args: argparse.Namespace):
+    db.init_engine()
+    run_info = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": db.get_engine().dialect.name,
+        "match_rate": args.match_rate,
+        "seed": args.seed,
+    }
+    output = open(args.output, "a") if args.output else sys.stdout
+
+    try:
+        for guilds, triggers, complexity, actions in itertools.product(
+            args.guilds, args.triggers, args.complexity, args.actions
+        ):
+            result = await run_cell(
+                args, guilds, triggers, complexity, actions
+            )
+            output.write(json.dumps({**run_info, **result}) + "\n")
+            output.flush()
+    finally:
+        await db.deinit_engine()
+
+        if output is not sys.stdout:
+            output.close()
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_URI"] = (
+            args.db_uri or f"sqlite+aiosqlite:///{tmp}/benchmark.db"
+        )
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Replays a captured gateway event stream through the trigger pipeline
+
+Feeds the events recorded by the Recorder cog (RECORD_EVENTS) to the
+ActionExecutor listeners, with Discord I/O replaced by the fakes of the
+pipeline benchmark, and prints a JSON report of the throughput and of the
+triggers that fired.
+
+    python -m benchmarks.replay events.jsonl.gz --speed 10 --top 20
+
+Triggers are loaded from the database given with --db-uri or DB_URI, e.g. a
+copy of production, and nothing is written to it. --speed 0 (the default)
+replays as fast as possible, 1 at the recorded pace and anything else
+scales the recorded gaps between events.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from types import SimpleNamespace
+
+import discord
+
+from benchmarks.pipeline import (
+    FakeBot,
+    FakeChannel,
+    FakeGuild,
+    fake_member,
+    git_revision,
+    latency_stats,
+)
+from bot import db
+from bot.budgets import ExecutionBudgets
+from bot.cogs.action_executor import ActionExecutor
+from bot.execution import SendScheduler
+from bot.recording import read_events
+from bot.registry import trigger_registry
+
+
+class Replayer:
+    """Turns recorded events back into the objects the listeners expect"""
+
+    def __init__(self, bot: FakeBot, executor: ActionExecutor):
+        self.bot = bot
+        self.guilds: dict[int, FakeGuild] = {}
+        self.listeners = {
+            "MESSAGE_CREATE": (executor.on_message, self.message),
+            "MESSAGE_REACTION_ADD": (
+                executor.on_raw_reaction_add,
+                self.reaction,
+            ),
+            "MESSAGE_REACTION_REMOVE": (
+                executor.on_raw_reaction_remove,
+                self.reaction,
+            ),
+            "GUILD_MEMBER_ADD": (executor.on_member_join, self.member),
+            "GUILD_MEMBER_REMOVE": (executor.on_member_remove, self.member),
+        }
+
+    def guild(self, guild_id: int) -> FakeGuild:
+        if (guild := self.guilds.get(guild_id)) is None:
+            guild = self.guilds[guild_id] = FakeGuild(guild_id)
+
+        return guild
+
+    def channel(self, channel_id: int, guild: FakeGuild) -> FakeChannel:
+        if (channel := self.bot.channels.get(channel_id)) is None:
+            channel = self.bot.channels[channel_id] = FakeChannel(
+                channel_id, guild
+            )
+
+        return channel
+
+    def message(self, event: dict) -> SimpleNamespace:
+        guild = self.guild(event["guild_id"])
+        channel = self.channel(event["channel_id"], guild)
+
+        return SimpleNamespace(
+            guild=guild,
+            channel=SimpleNamespace(id=channel.id, mention=f"<#{channel.id}>"),
+            # Content recorded with RECORD_REDACT=drop
+            content=event["content"] or "",
+            author=fake_member(event["author_id"], guild),
+        )
+
+    def reaction(self, event: dict) -> discord.RawReactionActionEvent:
+        guild = self.guild(event["guild_id"])
+        self.channel(event["channel_id"], guild)
+        event_type = event["t"].removeprefix("MESSAGE_")
+
+        payload = discord.RawReactionActionEvent(
+            {
+                "message_id": event["message_id"],
+                "channel_id": event["channel_id"],
+                "user_id": event["user_id"],
+                "guild_id": event["guild_id"],
+            },  # type: ignore
+            discord.PartialEmoji(
+                name=event["emoji_name"], id=event["emoji_id"]
+            ),
+            event_type,
+        )
+
+        if event_type == "REACTION_ADD":
+            payload.member = fake_member(event["user_id"], guild)  # type: ignore
+
+        return payload
+
+    def member(self, event: dict) -> SimpleNamespace:
+        return fake_member(event["user_id"], self.guild(event["guild_id"]))
+
+
+async def replay(args: argparse.Namespace) -> dict:
+    await trigger_registry.load()
+
+    bot = FakeBot()
+    executor = ActionExecutor(bot)  # type: ignore
+    # No pacing, only the pipeline itself is being measured
+    executor.send_scheduler = SendScheduler(
+        rate=10**9, per=1.0, max_pending=10**9
+    )
+    executor.budgets = ExecutionBudgets()
+    replayer = Replayer(bot, executor)
+
+    fired: Counter[int] = Counter()
+    execute_triggers = executor.execute_triggers
+
+    async def count_fired(triggers, context):
+        fired.update(trigger.id for trigger in triggers)
+        await execute_triggers(triggers, context)
+
+    executor.execute_triggers = count_fired  # type: ignore
+
+    latencies: dict[str, list[float]] = {t: [] for t in replayer.listeners}
+    skipped = 0
+    previous_ts = None
+    start = time.perf_counter()
+
+    for event in read_events(args.capture):
+        if (entry := replayer.listeners.get(event.get("t"))) is None:
+            skipped += 1
+            continue
+
+        # A capture resumed after a restart starts again from 0
+        if args.speed and previous_ts is not None:
+            if (delay := (event["ts"] - previous_ts) / args.speed) > 0:
+                await asyncio.sleep(delay)
+
+        previous_ts = event["ts"]
+        listener, build = entry
+
+        event_start = time.perf_counter()
+        await listener(build(event))
+        latencies[event["t"]].append(time.perf_counter() - event_start)
+
+    await executor.action_queue.join()
+
+    await executor.send_scheduler.join()
+
+    elapsed = time.perf_counter() - start
+    executor.cog_unload()
+    replayed = sum(len(values) for values in latencies.values())
+
+    report = {
+        "capture": args.capture,
+        "revision": git_revision(),
+        "speed": args.speed,
+        "events": replayed,
+        "skipped_events": skipped,
+        "seconds": round(elapsed, 4),
+        "events_per_second": round(replayed / elapsed, 1) if elapsed else None,
+        "messages_sent": sum(c.sent for c in bot.channels.values()),
+        "triggers_fired": sum(fired.values()),
+        "top_triggers": [
+            {"trigger_id": trigger_id, "fired": count}
+            for trigger_id, count in fired.most_common(args.top)
+        ],
+        "event_counts": {
+            event_type: len(values)
+            for event_type, values in latencies.items()
+            if values
+        },
+    }
+
+    for event_type, values in latencies.items():
+        report.update(latency_stats(values, f"{event_type.lower()}_"))
+
+    return report
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="file written by the Recorder cog")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="multiple of the recorded pace, 0 for as fast as possible",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="number of triggers to list"
+    )
+    parser.add_argument(
+        "--db-uri",
+        help="database to load the triggers from, DB_URI by default",
+    )
+    args = parser.parse_args(argv)
+
+    if args.speed < 0:
+        parser.error("--speed can't be negative")
+
+    return args
+
+
+async def run(args: argparse.Namespace):
+    db.init_engine()
+
+    try:
+        report = await replay(args)
+    finally:
+        await db.deinit_engine()
+
+    sys.stdout.write(json.dumps(report) + "\n")
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+
+    if args.db_uri:
+        os.environ["DB_URI"] = args.db_uri
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Checks trigger change notifications between two bot processes on Postgres
+
+Starts a listener process with its own trigger registry, makes changes
+through trigger_sync in this one, and waits for the listener's registry to
+match the database after each scenario:
+
+- a trigger followed straight away by its actions, each a separate notification
+- a trigger removed while the listener is still fetching it
+- a guild import
+- changes made while the listener is loading its registry
+- changes made while the listener's connection has been terminated
+
+    python -m benchmarks.sync_check --db-uri postgresql+asyncpg://localhost/automic
+
+The database must already be migrated. Only rows of a randomly chosen guild
+ID are written, and they are removed afterwards. Exits with status 1 if any
+scenario fails.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.future import select
+
+from bot import db
+from bot.db import fetch_rows, models
+from bot.enums import ActionType, TriggerType
+from bot.registry import trigger_registry
+from bot.sync import CHANNEL, trigger_sync
+
+TIMEOUT = 10.0
+
+
+def new_trigger(guild_id: int) -> models.Trigger:
+    return models.Trigger(
+        guild_id=guild_id,
+        type=TriggerType.MemberJoin,
+        activation_params={"member_id": None},
+    )
+
+
+def new_action(guild_id: int, trigger: models.Trigger) -> models.Action:
+    return models.Action(
+        guild_id=guild_id,
+        type=ActionType.MessageSend,
+        action_params={
+            "message_content": "Welcome {member_mention}!",
+            "channel_id": 1,
+        },
+        trigger=trigger,
+    )
+
+
+def registry_state(guild_id: int) -> dict:
+    triggers = trigger_registry.search_triggers(guild_id, "", limit=10**6)
+
+    return {
+        "triggers": sorted(trigger.id for trigger in triggers),
+        "actions": sorted(
+            action.id
+            for trigger in triggers
+            for action in trigger_registry.get_actions(trigger.id)
+        ),
+    }
+
+
+async def database_state(guild_id: int) -> dict:
+    triggers = await fetch_rows(
+        select(models.Trigger.id).where(models.Trigger.guild_id == guild_id)
+    )
+    actions = await fetch_rows(
+        select(models.Action.id).where(models.Action.guild_id == guild_id)
+    )
+
+    return {
+        "triggers": sorted(row.id for row in triggers),
+        "actions": sorted(row.id for row in actions),
+    }
+
+
+async def listen():
+    """Runs the listener process, answering commands read from stdin"""
+
+    db.init_engine()
+    await trigger_sync.start()
+    loop = asyncio.get_running_loop()
+
+    def reply(value):
+        sys.stdout.write(json.dumps(value) + "\n")
+        sys.stdout.flush()
+
+    reply("ready")
+
+    while line := await loop.run_in_executor(None, sys.stdin.readline):
+        command, _, argument = line.strip().partition(" ")
+
+        if command == "state":
+            reply(registry_state(int(argument)))
+        elif command == "pid":
+            connection = trigger_sync._connection
+            reply(connection.get_server_pid() if connection else None)
+        elif command == "restart":
+            await trigger_sync.stop()
+            await trigger_sync.start()
+            reply("restarted")
+
+    await trigger_sync.stop()
+    await db.deinit_engine()
+
+
+class Listener:
+    """The listener process, seen from the process making changes"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+
+    @classmethod
+    async def start(cls) -> "Listener":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "benchmarks.sync_check",
+            "--listener",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        listener = cls(process)
+        await listener.read()
+        return listener
+
+    async def read(self):
+        while True:
+            line = await asyncio.wait_for(
+                self.process.stdout.readline(), TIMEOUT  # type: ignore
+            )
+
+            if not line:
+                raise Exception("The listener exited")
+
+            # Anything else the listener printed is passed through
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  listener: {line.decode().rstrip()}")
+
+    async def ask(self, command: str):
+        self.process.stdin.write(f"{command}\n".encode())  # type: ignore
+        await self.process.stdin.drain()  # type: ignore
+        return await self.read()
+
+    async def stop(self):
+        self.process.stdin.close()  # type: ignore
+        await self.process.wait()
+
+
+async def wait_for_sync(listener: Listener, guild_id: int) -> bool:
+    """Waits until the listener's registry has the same rows as the database"""
+
+    expected = await database_state(guild_id)
+    deadline = time.monotonic() + TIMEOUT
+
+    while time.monotonic() < deadline:
+        if await listener.ask(f"state {guild_id}") == expected:
+            return True
+
+        await asyncio.sleep(0.1)
+
+    print(f"  expected {expected}")
+    print(f"  listener {await listener.ask(f'state {guild_id}')}")
+    return False
+
+
+async def add_with_actions(guild_id: int, actions: int):
+    async with db.async_session() as session:
+        trigger = new_trigger(guild_id)
+        session.add(trigger)
+        await session.commit()
+
+    await trigger_sync.trigger_added(trigger)
+
+    for _ in range(actions):
+        async with db.async_session() as session:
+            action = new_action(guild_id, trigger)
+            session.add(action)
+            await session.commit()
+
+        await trigger_sync.action_added(action)
+
+    return trigger
+
+
+async def check_trigger_then_actions(guild_id: int, _listener: Listener):
+    for _ in range(5):
+        await add_with_actions(guild_id, actions=3)
+
+
+async def publish_together(guild_id: int, *changes: tuple[str, int]):
+    """Sends several notifications in one transaction, so that the listener receives them at once"""
+
+    async with db.get_engine().begin() as connection:
+        for operation, trigger_id in changes:
+            payload = json.dumps(
+                {
+                    "origin": trigger_sync.process_id,
+                    "operation": operation,
+                    "guild_id": guild_id,
+                    "trigger_id": trigger_id,
+                    "action_id": None,
+                }
+            )
+            await connection.execute(select(func.pg_notify(CHANNEL, payload)))
+
+
+async def check_add_then_remove(guild_id: int, _listener: Listener):
+    for _ in range(5):
+        async with db.async_session() as session:
+            trigger = new_trigger(guild_id)
+            trigger.actions = [new_action(guild_id, trigger)]
+            session.add(trigger)
+            await session.commit()
+
+        # The removal arrives while the listener is still fetching the
+        # trigger, it must not be added back once the fetch completes.
+        await publish_together(
+            guild_id,
+            ("trigger_add", trigger.id),  # type: ignore
+            ("trigger_remove", trigger.id),  # type: ignore
+        )
+
+        async with db.async_session() as session:
+            await session.execute(
+                delete(models.Trigger).where(models.Trigger.id == trigger.id)
+            )
+            await session.commit()
+
+
+async def check_import(guild_id: int, _listener: Listener):
+    triggers = []
+
+    for _ in range(10):
+        trigger = new_trigger(guild_id)
+        trigger.actions = [new_action(guild_id, trigger) for _ in range(2)]
+        triggers.append(trigger)
+
+    async with db.async_session() as session:
+        session.add_all(triggers)
+        await session.commit()
+
+    await trigger_sync.triggers_imported(guild_id, triggers)
+
+
+async def keep_changing(guild_id: int, done: asyncio.Event):
+    """Adds triggers with an action each until done is set"""
+
+    while not done.is_set():
+        await add_with_actions(guild_id, actions=1)
+
+
+async def check_load(guild_id: int, listener: Listener):
+    done = asyncio.Event()
+    changes = asyncio.create_task(keep_changing(guild_id, done))
+
+    # Changes committed during the load must be neither missed nor wiped
+    await listener.ask("restart")
+    done.set()
+    await changes
+
+
+async def check_reconnect(guild_id: int, listener: Listener):
+    pid = await listener.ask("pid")
+    done = asyncio.Event()
+    changes = asyncio.create_task(keep_changing(guild_id, done))
+
+    async with db.get_engine().begin() as connection:
+        await connection.execute(
+            select(func.pg_terminate_backend(pid))  # type: ignore
+        )
+
+    # Missed while disconnected, picked up by the reload after reconnecting
+    deadline = time.monotonic() + TIMEOUT
+
+    while await listener.ask("pid") in (pid, None):
+        if time.monotonic() > deadline:
+            raise Exception("The listener didn't reconnect")
+
+        await asyncio.sleep(0.1)
+
+    done.set()
+    await changes
+
+
+CHECKS = {
+    "trigger then actions": check_trigger_then_actions,
+    "add then remove": check_add_then_remove,
+    "import": check_import,
+    "load": check_load,
+    "reconnect": check_reconnect,
+}
+
+
+async def run() -> bool:
+    db.init_engine()
+
+    if not trigger_sync.enabled:
+        raise Exception("Trigger sync only works on Postgres, check DB_URI")
+
+    async with db.get_engine().connect() as connection:
+        await connection.execute(text("SELECT 1 FROM triggers LIMIT 1"))
+
+    guild_id = random.randrange(1 << 40, 1 << 50)
+    listener = await Listener.start()
+    passed = True
+
+    try:
+        for name, check in CHECKS.items():
+            await check(guild_id, listener)
+            ok = await wait_for_sync(listener, guild_id)
+            passed &= ok
+            print(f"{'ok' if ok else 'FAILED'}: {name}")
+    finally:
+        await listener.stop()
+
+        async with db.async_session() as session:
+            await session.execute(
+                delete(models.Trigger).where(
+                    models.Trigger.guild_id == guild_id
+                )
+            )
+            await session.commit()
+
+        await db.deinit_engine()
+
+    return passed
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--db-uri", help="Postgres database to use, DB_URI by default"
+    )
+    parser.add_argument(
+        "--listener", action="store_true", help=argparse.SUPPRESS
+    )
+    args = parser.parse_args(argv)
+
+    if args.db_uri:
+        os.environ["DB_URI"] = args.db_uri
+
+    if args.listener:
+        asyncio.run(listen())
+    elif not asyncio.run(run()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
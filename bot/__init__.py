@@ -4,18 +4,40 @@ import asyncio
 import pathlib
 import discord
 from discord.ext import commands
-from sqlalchemy.future import select
 
 from bot import db
-from bot.db import models
+from bot.enums import TriggerType
+from bot.metrics import METRICS_HOST, METRICS_PORT, metrics_server
+from bot.records import CompiledTrigger
+from bot.registry import REACTION_TRIGGER_TYPES, trigger_registry
+from bot.sync import trigger_sync
 
 if testing_guilds_txt := os.getenv("TESTING_GUILDS"):
     TESTING_GUILDS: list[int] | None = json.loads(testing_guilds_txt)
 else:
     TESTING_GUILDS = None
 
+# Set by the shard launcher for each of its worker processes
+if shard_ids_txt := os.getenv("SHARD_IDS"):
+    SHARD_IDS: list[int] | None = json.loads(shard_ids_txt)
+    SHARD_COUNT = int(os.environ["SHARD_COUNT"])
+else:
+    SHARD_IDS = None
+    SHARD_COUNT = None
+
 intents = discord.Intents.all()
-bot = commands.Bot(intents=intents)
+
+if SHARD_IDS is not None:
+    # Application commands are registered once for the whole bot,
+    # so only the worker that runs shard 0 syncs them.
+    bot = commands.AutoShardedBot(
+        intents=intents,
+        shard_ids=SHARD_IDS,
+        shard_count=SHARD_COUNT,
+        auto_sync_commands=0 in SHARD_IDS,
+    )
+else:
+    bot = commands.Bot(intents=intents)
 
 
 @bot.event
@@ -29,21 +51,34 @@ async def ping(ctx: discord.ApplicationContext):
     await ctx.respond(f"Pong! That took `{latency} ms`!")
 
 
-async def trigger_id_autocomplete(
-    ctx: discord.AutocompleteContext,
-) -> list[int]:
-    """Returns a list of trigger IDs in the current server."""
+def describe_trigger(trigger: CompiledTrigger) -> str:
+    """Returns a short description of a trigger for autocomplete choices"""
 
-    async with db.async_session() as session:
-        query = select(models.Trigger).where(
-            models.Trigger.guild_id == ctx.interaction.guild_id
+    if trigger.type == TriggerType.Message:
+        details = trigger.match_statement
+    elif trigger.type in REACTION_TRIGGER_TYPES:
+        details = f"{trigger.emoji or 'any emoji'} on {trigger.message_id}"
+    else:
+        details = (
+            "any member" if trigger.member_id is None else trigger.member_id
         )
-        triggers = await session.scalars(query)
-        return [
-            t.id
-            for t in triggers
-            if str(t.id) in ctx.value or len(ctx.value) == 0
-        ]
+
+    description = f"{trigger.id} · {trigger.type.name}: {details}"
+    return description if len(description) <= 100 else description[:97] + "..."
+
+
+async def trigger_id_autocomplete(
+    ctx: discord.AutocompleteContext,
+) -> list[discord.OptionChoice]:
+    """Returns up to 25 triggers in the current server whose ID starts with what has been typed."""
+
+    triggers = trigger_registry.search_triggers(
+        ctx.interaction.guild_id, str(ctx.value or "").strip()  # type: ignore
+    )
+    return [
+        discord.OptionChoice(describe_trigger(trigger), trigger.id)
+        for trigger in triggers
+    ]
 
 
 def add_cogs():
@@ -64,9 +99,23 @@ def main(token: str):
 
     try:
         db.init_engine()
+
+        if SHARD_IDS is not None:
+            trigger_registry.set_shards(SHARD_IDS, SHARD_COUNT)  # type: ignore
+
+        # Also loads the trigger registry
+        loop.run_until_complete(trigger_sync.start())
+
+        if METRICS_PORT:
+            loop.run_until_complete(
+                metrics_server.start(METRICS_HOST, int(METRICS_PORT))
+            )
+
         add_cogs()
         loop.run_until_complete(bot.start(token))
     except KeyboardInterrupt or SystemExit:
         print("Shutting down...")
         loop.run_until_complete(bot.close())
+        loop.run_until_complete(trigger_sync.stop())
+        loop.run_until_complete(metrics_server.stop())
         loop.run_until_complete(db.deinit_engine())
@@ -0,0 +1,164 @@
+import time
+from typing import NamedTuple
+
+from bot import metrics
+from bot.records import CompiledTrigger
+
+
+class Trip(NamedTuple):
+    """An open circuit breaker: what was exceeded and until when (a Unix timestamp)"""
+
+    reason: str
+    until: float
+
+
+class ExecutionBudgets:
+    """Per-guild and per-trigger limits on the work done by the trigger pipeline
+
+    Each budget is counted over fixed windows of `window` seconds, a limit of 0
+    disables it. Exceeding a trigger's budget trips that trigger's circuit
+    breaker, exceeding a guild's budget trips the guild's, which disables all
+    of its triggers. Breakers close again on their own after `cooldown`
+    seconds.
+    """
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        cooldown: float = 300.0,
+        trigger_executions: int = 0,
+        guild_executions: int = 0,
+        guild_match_seconds: float = 0.0,
+        guild_queued_actions: int = 0,
+    ):
+        self.window = window
+        self.cooldown = cooldown
+        self.trigger_executions = trigger_executions
+        self.guild_executions = guild_executions
+        self.guild_match_seconds = guild_match_seconds
+        self.guild_queued_actions = guild_queued_actions
+
+        # Key: [window start, executions, matching seconds]
+        self._trigger_windows: dict[int, list[float]] = {}
+        self._guild_windows: dict[int, list[float]] = {}
+        self._trigger_trips: dict[int, Trip] = {}
+        self._guild_trips: dict[int, Trip] = {}
+
+    def _window(
+        self, windows: dict[int, list[float]], key: int
+    ) -> list[float]:
+        now = time.monotonic()
+
+        if (entry := windows.get(key)) is None or now - entry[
+            0
+        ] >= self.window:
+            entry = windows[key] = [now, 0, 0.0]
+
+        return entry
+
+    def _open(self, trips: dict[int, Trip], key: int) -> Trip | None:
+        if (trip := trips.get(key)) is None:
+            return None
+
+        if trip.until <= time.time():
+            del trips[key]
+            return None
+
+        return trip
+
+    def _trip(
+        self,
+        scope: str,
+        trips: dict[int, Trip],
+        key: int,
+        budget: str,
+        reason: str,
+    ):
+        trips[key] = Trip(reason, time.time() + self.cooldown)
+        metrics.breaker_trips.inc(scope, budget)
+        print(
+            f"Disabled {scope} {key} for {self.cooldown:g} seconds: {reason}"
+        )
+
+    def trip_for(self, guild_id: int, trigger_id: int) -> Trip | None:
+        """Returns the open breaker that disables a trigger, if any"""
+
+        return self._open(self._guild_trips, guild_id) or self._open(
+            self._trigger_trips, trigger_id
+        )
+
+    def guild_allowed(self, guild_id: int) -> bool:
+        return self._open(self._guild_trips, guild_id) is None
+
+    def record_match(self, guild_id: int, seconds: float):
+        """Counts time spent matching an event against a guild's triggers"""
+
+        if not self.guild_match_seconds:
+            return
+
+        entry = self._window(self._guild_windows, guild_id)
+        entry[2] += seconds
+
+        if entry[2] > self.guild_match_seconds and self.guild_allowed(
+            guild_id
+        ):
+            self._trip(
+                "guild",
+                self._guild_trips,
+                guild_id,
+                "match_seconds",
+                f"over {self.guild_match_seconds:g}s of matching in {self.window:g}s",
+            )
+
+    def allow_execution(self, trigger: CompiledTrigger) -> bool:
+        """Counts an execution of a matched trigger, returns False if it's disabled or over budget"""
+
+        if self.trip_for(trigger.guild_id, trigger.id):
+            return False
+
+        if self.guild_executions:
+            entry = self._window(self._guild_windows, trigger.guild_id)
+            entry[1] += 1
+
+            if entry[1] > self.guild_executions:
+                self._trip(
+                    "guild",
+                    self._guild_trips,
+                    trigger.guild_id,
+                    "executions",
+                    f"over {self.guild_executions} executions in {self.window:g}s",
+                )
+                return False
+
+        if self.trigger_executions:
+            entry = self._window(self._trigger_windows, trigger.id)
+            entry[1] += 1
+
+            if entry[1] > self.trigger_executions:
+                self._trip(
+                    "trigger",
+                    self._trigger_trips,
+                    trigger.id,
+                    "executions",
+                    f"over {self.trigger_executions} executions in {self.window:g}s",
+                )
+                return False
+
+        return True
+
+    def allow_queued(self, trigger: CompiledTrigger, queued: int) -> bool:
+        """Returns False, tripping the guild's breaker, if the guild already has too many actions queued"""
+
+        if not self.guild_queued_actions or queued < self.guild_queued_actions:
+            return True
+
+        if self.guild_allowed(trigger.guild_id):
+            self._trip(
+                "guild",
+                self._guild_trips,
+                trigger.guild_id,
+                "queued_actions",
+                f"{self.guild_queued_actions} actions already queued",
+            )
+
+        return False
@@ -0,0 +1,228 @@
+import json
+from typing import Any, Iterable
+
+import discord
+import yaml
+
+from bot.db import models
+from bot.enums import ActionType, TriggerType
+from bot.patterns import check_pattern
+from bot.templates import CompiledTemplate, TemplateError
+
+MAX_IMPORT_SIZE = 1_000_000
+MAX_IMPORT_TRIGGERS = 1000
+YAML_EXTENSIONS = (".yaml", ".yml")
+
+# Parameter name -> (type, required) for each trigger and action type
+ACTIVATION_PARAMS: dict[TriggerType, dict[str, tuple[type, bool]]] = {
+    TriggerType.Message: {
+        "match_statement": (str, True),
+        "channel_id": (int, True),
+    },
+    TriggerType.ReactionAdd: {
+        "channel_id": (int, True),
+        "message_id": (int, True),
+        "emoji": (str, False),
+    },
+    TriggerType.ReactionRemove: {
+        "channel_id": (int, True),
+        "message_id": (int, True),
+        "emoji": (str, False),
+    },
+    TriggerType.MemberJoin: {"member_id": (int, False)},
+    TriggerType.MemberLeave: {"member_id": (int, False)},
+}
+ACTION_PARAMS: dict[ActionType, dict[str, tuple[type, bool]]] = {
+    ActionType.MessageSend: {
+        "message_content": (str, True),
+        "channel_id": (int, True),
+    },
+}
+
+
+def load_document(content: bytes, filename: str) -> Any:
+    """Parses an uploaded JSON or YAML file, chosen by its extension"""
+
+    try:
+        if filename.lower().endswith(YAML_EXTENSIONS):
+            return yaml.safe_load(content)
+
+        return json.loads(content)
+    except (ValueError, yaml.YAMLError) as e:
+        raise ValueError(f"Unable to read `{filename}`: {e}") from e
+
+
+def dump_document(document: dict, file_format: str) -> bytes:
+    if file_format == "yaml":
+        return yaml.safe_dump(document, sort_keys=False).encode()
+
+    return json.dumps(document, indent=2).encode()
+
+
+def _read_params(
+    item: dict, spec: dict[str, tuple[type, bool]], where: str
+) -> dict:
+    params = {}
+
+    for name, (kind, required) in spec.items():
+        value = item.get(name)
+
+        if value is None:
+            if required:
+                raise ValueError(f"{where}: `{name}` is required")
+        elif kind is int:
+            # IDs may be written as strings to survive JSON parsers
+            # that can't represent 64-bit integers exactly.
+            if isinstance(value, str) and value.isnumeric():
+                value = int(value)
+            elif not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"{where}: `{name}` must be an ID")
+        elif not isinstance(value, kind):
+            raise ValueError(f"{where}: `{name}` must be a string")
+
+        params[name] = value
+
+    if unknown := sorted(item.keys() - spec.keys() - {"type", "actions"}):
+        raise ValueError(f"{where}: unknown parameter `{unknown[0]}`")
+
+    return params
+
+
+def _read_type(item: Any, enum: type, where: str) -> Any:
+    if not isinstance(item, dict):
+        raise ValueError(f"{where}: expected a mapping")
+
+    try:
+        return enum[str(item.get("type"))]
+    except KeyError:
+        names = ", ".join(member.name for member in enum)  # type: ignore
+        raise ValueError(f"{where}: `type` must be one of {names}") from None
+
+
+def _check_channel(guild: discord.Guild, channel_id: int, where: str):
+    if not isinstance(guild.get_channel(channel_id), discord.TextChannel):
+        raise ValueError(
+            f"{where}: `{channel_id}` isn't a text channel in this server"
+        )
+
+
+def build_triggers(
+    document: Any, guild: discord.Guild
+) -> list[models.Trigger]:
+    """Validates an imported document and builds the triggers and actions it describes, without adding them to a session.
+    Raises ValueError, naming the offending entry, if anything is invalid.
+    """
+
+    if not isinstance(document, dict) or not isinstance(
+        items := document.get("triggers"), list
+    ):
+        raise ValueError("Expected a `triggers` list at the top level")
+
+    if len(items) > MAX_IMPORT_TRIGGERS:
+        raise ValueError(
+            f"Only up to {MAX_IMPORT_TRIGGERS} triggers can be imported at once"
+        )
+
+    triggers = []
+
+    for i, item in enumerate(items):
+        where = f"triggers[{i}]"
+        trigger_type: TriggerType = _read_type(item, TriggerType, where)
+        params = _read_params(item, ACTIVATION_PARAMS[trigger_type], where)
+
+        if "channel_id" in params:
+            _check_channel(guild, params["channel_id"], where)
+
+        if emoji := params.get("emoji"):
+            emoji = emoji.strip()
+            # Custom emojis are stored by ID, like the reaction commands do
+            if emoji.startswith("<") and emoji.endswith(">"):
+                params["emoji"] = emoji.strip("<>").split(":")[-1]
+
+        trigger = models.Trigger(
+            guild_id=guild.id,
+            type=trigger_type,
+            activation_params=params,
+        )
+
+        if trigger_type == TriggerType.Message:
+            try:
+                analysis = check_pattern(params["match_statement"])
+            except ValueError as e:
+                raise ValueError(f"{where}: {e}") from None
+
+            trigger.match_kind = analysis.kind
+            trigger.match_cost = analysis.cost
+
+        actions = item.get("actions") or []
+
+        if not isinstance(actions, list):
+            raise ValueError(f"{where}: `actions` must be a list")
+
+        # Assigned even when empty, so that the collection is never lazy loaded
+        trigger.actions = [
+            _build_action(action_item, trigger, guild, f"{where}.actions[{j}]")
+            for j, action_item in enumerate(actions)
+        ]
+
+        triggers.append(trigger)
+
+    return triggers
+
+
+def _build_action(
+    item: Any, trigger: models.Trigger, guild: discord.Guild, where: str
+) -> models.Action:
+    action_type: ActionType = _read_type(item, ActionType, where)
+
+    if action_type not in ACTION_PARAMS:
+        raise ValueError(
+            f"{where}: {action_type.name} actions can't be imported"
+        )
+
+    params = _read_params(item, ACTION_PARAMS[action_type], where)
+    _check_channel(guild, params["channel_id"], where)
+
+    if action_type == ActionType.MessageSend:
+        try:
+            template = CompiledTemplate(params["message_content"])
+        except TemplateError as e:
+            raise ValueError(f"{where}: {e}") from None
+        except ValueError:
+            raise ValueError(
+                f"{where}: `message_content` isn't formatted correctly, make sure every `{{` has a matching `}}`"
+            ) from None
+
+        if invalid_params := sorted(
+            template.fields - trigger.type.value.keys()
+        ):
+            raise ValueError(
+                f"{where}: `{invalid_params[0]}` is an invalid parameter for `{trigger.type.name}` triggers"
+            )
+
+        try:
+            template.check()
+        except TemplateError as e:
+            raise ValueError(f"{where}: {e}") from None
+
+    return models.Action(
+        guild_id=trigger.guild_id, type=action_type, action_params=params
+    )
+
+
+def export_document(triggers: Iterable[models.Trigger]) -> dict:
+    """Builds a document in the import format from triggers with their actions loaded"""
+
+    return {
+        "triggers": [
+            {
+                "type": trigger.type.name,
+                **trigger.activation_params,
+                "actions": [
+                    {"type": action.type.name, **action.action_params}
+                    for action in trigger.actions
+                ],
+            }
+            for trigger in triggers
+        ]
+    }
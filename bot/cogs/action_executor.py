@@ -1,15 +1,19 @@
-import re
-import asyncio
-from typing import Iterable
+import os
+import time
 
 import discord
 from discord.abc import GuildChannel, PrivateChannel
 from discord.ext import commands
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from bot.db import async_session, models
+from bot import metrics
+from bot.budgets import ExecutionBudgets, Trip
 from bot.enums import ActionType, TriggerType
+from bot.execution import ActionJob, ActionQueue, SendScheduler
+from bot.matching import MessageMatcher, PatternCache, RegexPool
+from bot.profiling import profiler
+from bot.records import CompiledAction, CompiledTrigger
+from bot.registry import trigger_registry
+from bot.templates import TemplateContext
 
 
 class ActionExecutor(commands.Cog):
@@ -18,6 +22,93 @@ class ActionExecutor(commands.Cog):
     def __init__(self, bot: commands.Bot, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.bot = bot
+        self.pattern_cache = PatternCache(
+            int(os.getenv("PATTERN_CACHE_SIZE", 1024))
+        )
+
+        if regex_workers := int(os.getenv("REGEX_POOL_WORKERS", 0)):
+            self.regex_pool: RegexPool | None = RegexPool(
+                regex_workers,
+                timeout=float(os.getenv("REGEX_TIMEOUT", 0.25)),
+                max_timeouts=int(os.getenv("REGEX_MAX_TIMEOUTS", 3)),
+                cooldown=float(os.getenv("BREAKER_COOLDOWN", 300)),
+            )
+        else:
+            self.regex_pool = None
+
+        self.message_matcher = MessageMatcher(
+            self.pattern_cache, self.regex_pool
+        )
+        self.action_queue = ActionQueue(
+            self.execute_job,
+            workers=int(os.getenv("ACTION_WORKERS", 8)),
+            max_size=int(os.getenv("ACTION_QUEUE_SIZE", 1000)),
+            overflow=os.getenv("ACTION_QUEUE_OVERFLOW", "block"),
+        )
+
+        # Every budget is off (0) unless configured
+        self.budgets = ExecutionBudgets(
+            window=float(os.getenv("BUDGET_WINDOW", 60)),
+            cooldown=float(os.getenv("BREAKER_COOLDOWN", 300)),
+            trigger_executions=int(os.getenv("TRIGGER_MAX_EXECUTIONS", 0)),
+            guild_executions=int(os.getenv("GUILD_MAX_EXECUTIONS", 0)),
+            guild_match_seconds=float(os.getenv("GUILD_MAX_MATCH_SECONDS", 0)),
+            guild_queued_actions=int(os.getenv("GUILD_MAX_QUEUED_ACTIONS", 0)),
+        )
+
+        self.send_scheduler = SendScheduler(
+            rate=int(os.getenv("SEND_RATE", 5)),
+            per=float(os.getenv("SEND_RATE_PER", 5.0)),
+            max_pending=int(os.getenv("SEND_MAX_PENDING", 50)),
+            coalesce=os.getenv("SEND_COALESCE") == "1",
+        )
+
+        metrics.metrics_registry.register(
+            metrics.Gauge(
+                "automic_action_queue_size",
+                "Actions waiting to be executed",
+                lambda: len(self.action_queue),
+            )
+        )
+        metrics.metrics_registry.register(
+            metrics.Gauge(
+                "automic_actions_dropped",
+                "Actions dropped because the action queue was full",
+                lambda: self.action_queue.dropped,
+            )
+        )
+        metrics.metrics_registry.register(
+            metrics.Gauge(
+                "automic_sends_dropped",
+                "Messages dropped because a channel's send queue was full",
+                lambda: self.send_scheduler.dropped,
+            )
+        )
+
+    def trigger_trip(self, guild_id: int, trigger_id: int) -> Trip | None:
+        """Returns why a trigger is temporarily disabled, if it is: an open
+        circuit breaker or a match statement that keeps timing out
+        """
+
+        if trip := self.budgets.trip_for(guild_id, trigger_id):
+            return trip
+
+        if self.regex_pool and (
+            until := self.regex_pool.disabled_until(trigger_id)
+        ):
+            return Trip(
+                f"match statement timed out {self.regex_pool.max_timeouts} times",
+                until,
+            )
+
+        return None
+
+    def cog_unload(self):
+        self.action_queue.stop()
+        self.send_scheduler.stop()
+
+        if self.regex_pool:
+            self.regex_pool.close()
 
     async def get_or_fetch_channel(
         self, channel_id: int
@@ -37,59 +128,109 @@ class ActionExecutor(commands.Cog):
             member_id
         )
 
-    async def execute_action(self, action: models.Action, **kwargs):
-        params: dict = action.action_params  # type: ignore
-
+    async def execute_action(
+        self, action: CompiledAction, context: TemplateContext
+    ):
         if action.type == ActionType.MessageSend:
-            message_content = params["message_content"]
-            channel_id = params["channel_id"]
+            if action.template is None or action.channel_id is None:
+                return
 
-            formatted_msg_content = message_content.format(**kwargs)
-            channel = await self.get_or_fetch_channel(channel_id)
+            start = time.perf_counter()
+            formatted_msg_content = await context.render(action.template)
+            metrics.render_seconds.observe(
+                time.perf_counter() - start, context.trigger_type.name
+            )
+            channel = await self.get_or_fetch_channel(action.channel_id)
 
             if isinstance(channel, discord.TextChannel):
-                await channel.send(formatted_msg_content)
+                self.send_scheduler.send(channel, formatted_msg_content)
 
         # TODO: Add other action types...
 
+    async def execute_job(self, job: ActionJob):
+        labels = (job.trigger.type.name, job.action.type.name)
+        start = time.perf_counter()
+
+        try:
+            await self.execute_action(job.action, job.context)
+        except Exception:
+            metrics.action_errors.inc(*labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.record_action(
+                job.trigger.guild_id, job.trigger.id, elapsed
+            )
+
+        metrics.action_seconds.observe(elapsed, *labels)
+        metrics.actions_executed.inc(*labels)
+
+    async def execute_triggers(
+        self, triggers: list[CompiledTrigger], context: TemplateContext
+    ):
+        """Queues every action of the matched triggers for execution, skipping triggers that are over budget"""
+
+        for trigger in triggers:
+            if not self.budgets.allow_execution(trigger):
+                continue
+
+            for action in trigger_registry.get_actions(trigger.id):
+                if not self.budgets.allow_queued(
+                    trigger, self.action_queue.queued(trigger.guild_id)
+                ):
+                    break
+
+                await self.action_queue.submit(
+                    ActionJob(trigger, action, context)
+                )
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """Listens for Message trigger events"""
 
-        if not message.guild:
-            return
+        start = time.perf_counter()
+        metrics.events.inc("Message")
 
-        dynamic_params = TriggerType.Message.value.copy()
-        dynamic_params["member"] = message.author
-        dynamic_params["member_mention"] = message.author.mention
-        dynamic_params["channel"] = message.channel.mention  # type: ignore
-        dynamic_params["messsage_content"] = message.content
-
-        async with async_session() as session:
-            query = (
-                select(models.Trigger)
-                .where(models.Trigger.guild_id == message.guild.id)
-                .where(models.Trigger.type == TriggerType.Message)
-                .options(selectinload(models.Trigger.actions))
+        # A guild whose breaker is open doesn't get its messages matched
+        if not (
+            message.guild
+            and trigger_registry.watches(
+                TriggerType.Message, message.channel.id
             )
-            triggers: Iterable[models.Trigger] = await session.scalars(query)
+            and self.budgets.guild_allowed(message.guild.id)
+        ):
+            return
 
-        for trigger in triggers:
-            params: dict = trigger.activation_params  # type: ignore
-            match_statement: str = params["match_statement"]
-            channel_id: int = params["channel_id"]
+        triggers, cpu_seconds = await self.message_matcher.match(
+            message.guild.id, message.channel.id, message.content
+        )
+        elapsed = time.perf_counter() - start
+        metrics.match_seconds.observe(elapsed, "Message")
+        profiler.record_match("Message", message.guild.id, elapsed)
+        # Only the guild's own matching counts, not waiting on the regex pool
+        self.budgets.record_match(message.guild.id, cpu_seconds)
+        metrics.triggers_evaluated.inc(
+            "Message",
+            amount=self.message_matcher.count(
+                message.guild.id, message.channel.id
+            ),
+        )
 
-            re_result = re.fullmatch(match_statement, message.content)
+        if not triggers:
+            return
 
-            if re_result is not None and message.channel.id == channel_id:
-                trigger_dyn_params = dynamic_params.copy()
-                trigger_dyn_params["matched_string"] = re_result.string
+        metrics.trigger_matches.inc("Message", amount=len(triggers))
 
-                action_tasks = [
-                    self.execute_action(action, **trigger_dyn_params)
-                    for action in trigger.actions
-                ]
-                await asyncio.gather(*action_tasks)
+        context = TemplateContext(
+            TriggerType.Message,
+            member=lambda: message.author,
+            member_mention=lambda: message.author.mention,
+            channel=lambda: message.channel.mention,  # type: ignore
+            matched_string=lambda: message.content,
+            message_content=lambda: message.content,
+        )
+        await self.execute_triggers(triggers, context)
+        metrics.event_seconds.observe(time.perf_counter() - start, "Message")
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(
@@ -97,56 +238,60 @@ class ActionExecutor(commands.Cog):
     ):
         """Listens for ReactionAdd trigger events"""
 
-        channel = await self.get_or_fetch_channel(payload.channel_id)
+        start = time.perf_counter()
+        metrics.events.inc("ReactionAdd")
 
         if not (
             payload.guild_id
             and payload.member
-            and isinstance(channel, discord.TextChannel)
+            and trigger_registry.watches(
+                TriggerType.ReactionAdd, payload.message_id
+            )
         ):
             return
 
-        dynamic_params = TriggerType.ReactionAdd.value.copy()
-        dynamic_params["member"] = payload.member
-        dynamic_params["member_mention"] = payload.member.mention
-        dynamic_params["channel"] = channel.mention
-        dynamic_params["emoji"] = payload.emoji
-
-        async with async_session() as session:
-            query = (
-                select(models.Trigger)
-                .where(models.Trigger.guild_id == payload.guild_id)
-                .where(models.Trigger.type == TriggerType.ReactionAdd)
-                .options(selectinload(models.Trigger.actions))
-            )
-            triggers: Iterable[models.Trigger] = await session.scalars(query)
+        payload_emoji = (
+            payload.emoji.id
+            if payload.emoji.is_custom_emoji()
+            else payload.emoji.name
+        )
+        triggers = trigger_registry.get_reaction_triggers(
+            payload.guild_id,
+            TriggerType.ReactionAdd,
+            payload.channel_id,
+            payload.message_id,
+            payload_emoji,
+        )
+        elapsed = time.perf_counter() - start
+        metrics.match_seconds.observe(elapsed, "ReactionAdd")
+        profiler.record_match("ReactionAdd", payload.guild_id, elapsed)
+        self.budgets.record_match(payload.guild_id, elapsed)
 
-        for trigger in triggers:
-            params: dict = trigger.activation_params  # type: ignore
-            channel_id: int = params["channel_id"]
-            message_id: int = params["message_id"]
-            emoji: str | int | None = (
-                int(params["emoji"])
-                if params["emoji"].isnumeric()
-                else params["emoji"]
-            )
+        # The index only returns triggers that match
+        metrics.triggers_evaluated.inc("ReactionAdd", amount=len(triggers))
 
-            payload_emoji = (
-                payload.emoji.id
-                if payload.emoji.is_custom_emoji()
-                else payload.emoji.name
-            )
+        if not triggers:
+            return
 
-            if (
-                payload.channel_id == channel_id
-                and payload.message_id == message_id
-                and (emoji is None or emoji == payload_emoji)
-            ):
-                action_tasks = [
-                    self.execute_action(action, **dynamic_params)
-                    for action in trigger.actions
-                ]
-                await asyncio.gather(*action_tasks)
+        metrics.trigger_matches.inc("ReactionAdd", amount=len(triggers))
+
+        channel = await self.get_or_fetch_channel(payload.channel_id)
+
+        if not isinstance(channel, discord.TextChannel):
+            return
+
+        member = payload.member
+        context = TemplateContext(
+            TriggerType.ReactionAdd,
+            member=lambda: member,
+            member_mention=lambda: member.mention,
+            channel=lambda: channel.mention,
+            emoji=lambda: payload.emoji,
+        )
+        await self.execute_triggers(triggers, context)
+        metrics.event_seconds.observe(
+            time.perf_counter() - start, "ReactionAdd"
+        )
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(
@@ -154,112 +299,115 @@ class ActionExecutor(commands.Cog):
     ):
         """Listens for ReactionRemove trigger events"""
 
-        channel = await self.get_or_fetch_channel(payload.channel_id)
+        start = time.perf_counter()
+        metrics.events.inc("ReactionRemove")
 
-        if not (payload.guild_id and isinstance(channel, discord.TextChannel)):
+        if not (
+            payload.guild_id
+            and trigger_registry.watches(
+                TriggerType.ReactionRemove, payload.message_id
+            )
+        ):
             return
 
-        payload_member = await self.get_or_fetch_member(
-            channel.guild, payload.user_id
+        payload_emoji = (
+            payload.emoji.id
+            if payload.emoji.is_custom_emoji()
+            else payload.emoji.name
         )
+        triggers = trigger_registry.get_reaction_triggers(
+            payload.guild_id,
+            TriggerType.ReactionRemove,
+            payload.channel_id,
+            payload.message_id,
+            payload_emoji,
+        )
+        elapsed = time.perf_counter() - start
+        metrics.match_seconds.observe(elapsed, "ReactionRemove")
+        profiler.record_match("ReactionRemove", payload.guild_id, elapsed)
+        self.budgets.record_match(payload.guild_id, elapsed)
 
-        dynamic_params = TriggerType.ReactionRemove.value.copy()
-        dynamic_params["member"] = payload_member
-        dynamic_params["member_mention"] = payload_member.mention
-        dynamic_params["channel"] = channel.mention
-        dynamic_params["emoji"] = payload.emoji
-
-        async with async_session() as session:
-            query = (
-                select(models.Trigger)
-                .where(models.Trigger.guild_id == payload.guild_id)
-                .where(models.Trigger.type == TriggerType.ReactionRemove)
-                .options(selectinload(models.Trigger.actions))
-            )
-            triggers: Iterable[models.Trigger] = await session.scalars(query)
+        # The index only returns triggers that match
+        metrics.triggers_evaluated.inc("ReactionRemove", amount=len(triggers))
 
-        for trigger in triggers:
-            params: dict = trigger.activation_params  # type: ignore
-            channel_id: int = params["channel_id"]
-            message_id: int = params["message_id"]
-            emoji: str | int | None = (
-                int(params["emoji"])
-                if params["emoji"].isnumeric()
-                else params["emoji"]
-            )
+        if not triggers:
+            return
 
-            payload_emoji = (
-                payload.emoji.id
-                if payload.emoji.is_custom_emoji()
-                else payload.emoji.name
-            )
+        metrics.trigger_matches.inc("ReactionRemove", amount=len(triggers))
 
-            if (
-                payload.channel_id == channel_id
-                and payload.message_id == message_id
-                and (emoji is None or emoji == payload_emoji)
-            ):
-                action_tasks = [
-                    self.execute_action(action, **dynamic_params)
-                    for action in trigger.actions
-                ]
-                await asyncio.gather(*action_tasks)
+        channel = await self.get_or_fetch_channel(payload.channel_id)
+
+        if not isinstance(channel, discord.TextChannel):
+            return
+
+        async def member_mention() -> str:
+            return (await context.get("member")).mention
+
+        context = TemplateContext(
+            TriggerType.ReactionRemove,
+            member=lambda: self.get_or_fetch_member(
+                channel.guild, payload.user_id
+            ),
+            member_mention=member_mention,
+            channel=lambda: channel.mention,
+            emoji=lambda: payload.emoji,
+        )
+        await self.execute_triggers(triggers, context)
+        metrics.event_seconds.observe(
+            time.perf_counter() - start, "ReactionRemove"
+        )
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         """Listens for MemberJoin trigger events"""
 
-        dynamic_params = TriggerType.MemberJoin.value.copy()
-        dynamic_params["member"] = member
-        dynamic_params["member_mention"] = member.mention
-
-        async with async_session() as session:
-            query = (
-                select(models.Trigger)
-                .where(models.Trigger.guild_id == member.guild.id)
-                .where(models.Trigger.type == TriggerType.MemberJoin)
-                .options(selectinload(models.Trigger.actions))
-            )
-            triggers: Iterable[models.Trigger] = await session.scalars(query)
-
-        for trigger in triggers:
-            params: dict = trigger.activation_params  # type: ignore
-            trigger_member_id: int | None = params["member_id"]
-
-            if trigger_member_id is None or trigger_member_id == member.id:
-                action_tasks = [
-                    self.execute_action(action, **dynamic_params)
-                    for action in trigger.actions
-                ]
-                await asyncio.gather(*action_tasks)
+        await self.handle_member_event(member, TriggerType.MemberJoin)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
         """Listens for MemberLeave trigger events"""
 
-        dynamic_params = TriggerType.MemberLeave.value.copy()
-        dynamic_params["member"] = member
-        dynamic_params["member_mention"] = member.mention
+        await self.handle_member_event(member, TriggerType.MemberLeave)
 
-        async with async_session() as session:
-            query = (
-                select(models.Trigger)
-                .where(models.Trigger.guild_id == member.guild.id)
-                .where(models.Trigger.type == TriggerType.MemberLeave)
-                .options(selectinload(models.Trigger.actions))
-            )
-            triggers: Iterable[models.Trigger] = await session.scalars(query)
+    async def handle_member_event(
+        self, member: discord.Member, trigger_type: TriggerType
+    ):
+        start = time.perf_counter()
+        metrics.events.inc(trigger_type.name)
 
-        for trigger in triggers:
-            params: dict = trigger.activation_params  # type: ignore
-            trigger_member_id: int | None = params["member_id"]
-
-            if trigger_member_id is None or trigger_member_id == member.id:
-                action_tasks = [
-                    self.execute_action(action, **dynamic_params)
-                    for action in trigger.actions
-                ]
-                await asyncio.gather(*action_tasks)
+        if not trigger_registry.watches_guild(member.guild.id, trigger_type):
+            return
+
+        candidates = trigger_registry.get_triggers(
+            member.guild.id, trigger_type
+        )
+        triggers = [
+            trigger
+            for trigger in candidates
+            if trigger.member_id in (None, member.id)
+        ]
+        elapsed = time.perf_counter() - start
+        metrics.match_seconds.observe(elapsed, trigger_type.name)
+        profiler.record_match(trigger_type.name, member.guild.id, elapsed)
+        self.budgets.record_match(member.guild.id, elapsed)
+        metrics.triggers_evaluated.inc(
+            trigger_type.name, amount=len(candidates)
+        )
+
+        if not triggers:
+            return
+
+        metrics.trigger_matches.inc(trigger_type.name, amount=len(triggers))
+
+        context = TemplateContext(
+            trigger_type,
+            member=lambda: member,
+            member_mention=lambda: member.mention,
+        )
+        await self.execute_triggers(triggers, context)
+        metrics.event_seconds.observe(
+            time.perf_counter() - start, trigger_type.name
+        )
 
 
 def setup(bot: commands.Bot):
@@ -1,11 +1,15 @@
-from math import ceil, floor
+from typing import Sequence
 import discord
-from discord.ext import commands, pages
+from discord.ext import commands
+from sqlalchemy.engine import Row
 from sqlalchemy.future import select
 
 from bot import TESTING_GUILDS, trigger_id_autocomplete
 from bot.db import async_session, models
-from bot.enums import ActionType
+from bot.enums import ActionType, TriggerType
+from bot.paginator import KeysetPaginator
+from bot.sync import trigger_sync
+from bot.templates import CompiledTemplate, TemplateError
 
 
 class Actions(commands.Cog):
@@ -48,16 +52,35 @@ class Actions(commands.Cog):
                 )
                 return
 
-            # Validate dynamic parameters are valid for the chosen trigger type
             try:
-                message_content.format(**trigger.type.value)
-            except KeyError as e:
+                template = CompiledTemplate(message_content)
+            except TemplateError as e:
+                await ctx.respond(str(e), ephemeral=True)
+                return
+            except ValueError:
+                await ctx.respond(
+                    "That message content isn't formatted correctly, make sure every `{` has a matching `}`!",
+                    ephemeral=True,
+                )
+                return
+
+            # Validate dynamic parameters are valid for the chosen trigger type
+            if invalid_params := sorted(
+                template.fields - trigger.type.value.keys()
+            ):
                 await ctx.respond(
-                    f"`{e.args[0]}` is an invalid parameter for `{trigger.type.name}` triggers, please remove it!",
+                    f"`{invalid_params[0]}` is an invalid parameter for `{trigger.type.name}` triggers, please remove it!",
                     ephemeral=True,
                 )
                 return
 
+            # Format specs are only checked when the template is rendered
+            try:
+                template.check()
+            except TemplateError as e:
+                await ctx.respond(str(e), ephemeral=True)
+                return
+
             new_action = models.Action(
                 guild_id=ctx.guild_id,
                 type=ActionType.MessageSend,
@@ -70,6 +93,8 @@ class Actions(commands.Cog):
             session.add(new_action)
             await session.commit()
 
+        await trigger_sync.action_added(new_action)
+
         shortened_msg_content = (
             message_content
             if len(message_content) <= 100
@@ -121,52 +146,72 @@ class Actions(commands.Cog):
 
             await session.delete(action)
             await session.commit()
+            await trigger_sync.action_removed(action)
 
             await ctx.respond(embed=embed)
 
     @action_group.command(name="list")
-    async def list_actions(self, ctx: discord.ApplicationContext):
-        """List all the actions in the current server"""
+    @discord.option(
+        "trigger_type", choices=[t.name for t in TriggerType], default=None
+    )
+    async def list_actions(
+        self,
+        ctx: discord.ApplicationContext,
+        trigger_type: str | None,
+        channel: discord.TextChannel | None,
+    ):
+        """List the actions in the current server, optionally only those of one trigger type or channel"""
 
         if not ctx.guild:
             return
 
-        async with async_session() as session:
-            query = select(models.Action).where(
-                models.Action.guild_id == ctx.guild_id
-            )
-            actions: list[models.Action] = list(await session.scalars(query))
+        guild_name = ctx.guild.name
+        query = select(models.Action.__table__).where(
+            models.Action.guild_id == ctx.guild_id
+        )
 
-        if not actions:
-            await ctx.respond("This server has no actions!", ephemeral=True)
-            return
+        if trigger_type:
+            query = query.join(
+                models.Trigger.__table__,
+                models.Action.trigger_id == models.Trigger.id,
+            ).where(models.Trigger.type == TriggerType[trigger_type])
+        if channel:
+            query = query.where(models.Action.channel_id == channel.id)
 
-        max_per_page = 5
-        total_pages = ceil(len(actions) / max_per_page)
-        embeds = [
-            discord.Embed(
-                title=f"Actions in {ctx.guild.name}", color=self.theme
-            ).set_footer(text=f"Page {i + 1} of {total_pages}")
-            for i in range(total_pages)
-        ]
-
-        for i, action in enumerate(actions):
-            idx = floor(i / max_per_page)
-            params_txt = "\n".join(
-                [
-                    f"{key.replace('_', ' ').title()}: `{value}`"
-                    for key, value in action.action_params.items()
-                ]
-            )
+        def render(actions: Sequence[Row], page: int) -> discord.Embed:
+            embed = discord.Embed(
+                title=f"Actions in {guild_name}", color=self.theme
+            ).set_footer(text=f"Page {page + 1}")
+
+            for action in actions:
+                params_txt = "\n".join(
+                    [
+                        f"{key.replace('_', ' ').title()}: `{value}`"
+                        for key, value in action.action_params.items()
+                    ]
+                )
 
-            embeds[idx].add_field(
-                name=f"Action ID: {action.id}",
-                value=f"Trigger ID: {action.trigger_id}\nType: `{action.type.name}`\n{params_txt}",
-                inline=False,
-            )
+                embed.add_field(
+                    name=f"Action ID: {action.id}",
+                    value=f"Trigger ID: {action.trigger_id}\nType: `{action.type.name}`\n{params_txt}",
+                    inline=False,
+                )
+
+            return embed
 
-        paginator = pages.Paginator(embeds)  # type: ignore
-        await paginator.respond(ctx.interaction)
+        paginator = KeysetPaginator(
+            query, models.Action.id, render, ctx.author.id  # type: ignore
+        )
+
+        if not await paginator.respond(ctx):
+            await ctx.respond(
+                (
+                    "This server has no matching actions!"
+                    if trigger_type or channel
+                    else "This server has no actions!"
+                ),
+                ephemeral=True,
+            )
 
 
 def setup(bot: commands.Bot):
@@ -0,0 +1,119 @@
+import io
+import json
+import discord
+from discord.ext import commands
+
+from bot import TESTING_GUILDS
+from bot.profiling import MAX_PROFILE_SECONDS, profiler
+
+
+def format_ms(value: float) -> str:
+    return f"{value:.1f} ms" if value >= 1 else f"{value * 1000:.0f} µs"
+
+
+class Debug(commands.Cog):
+    """Diagnostics for the bot's owners"""
+
+    debug_group = discord.SlashCommandGroup(
+        name="debug",
+        description="Diagnostics for the bot's owners",
+        guild_ids=TESTING_GUILDS,
+    )
+    profile_group = debug_group.create_subgroup(
+        name="profile",
+        description="Find the servers and triggers using the most time",
+        guild_ids=TESTING_GUILDS,
+    )
+    theme = discord.Color.dark_gold()
+
+    def report_embed(self, summary: dict) -> discord.Embed:
+        embed = discord.Embed(
+            title="Profile",
+            description=f"{'Recording' if summary['active'] else 'Recorded'} for {summary['seconds']} seconds in this process.",
+            color=self.theme,
+        )
+
+        listeners = [
+            f"`{listener}` {format_ms(entry['match_ms'])} over {entry['events']} events"
+            for listener, entry in summary["listeners"].items()
+        ]
+        guilds = [
+            f"`{entry['guild_id']}` {format_ms(entry['total_ms'])} · matching {format_ms(entry['match_ms'])}, {entry['actions']} actions {format_ms(entry['action_ms'])}"
+            for entry in summary["guilds"]
+        ]
+        triggers = [
+            f"`{entry['trigger_id']}` in `{entry['guild_id']}` {format_ms(entry['action_ms'])} over {entry['actions']} actions"
+            for entry in summary["triggers"]
+        ]
+
+        for name, lines in (
+            ("Matching by listener", listeners),
+            ("Servers", guilds),
+            ("Triggers", triggers),
+        ):
+            value = "\n".join(lines) or "Nothing recorded"
+
+            # Embed field values are limited to 1024 characters
+            while len(value) > 1024:
+                lines.pop()
+                value = "\n".join(lines)
+
+            embed.add_field(name=name, value=value, inline=False)
+
+        return embed
+
+    @profile_group.command(name="start")
+    @commands.is_owner()
+    @discord.option(
+        "duration",
+        description="Seconds to record for",
+        min_value=1,
+        max_value=MAX_PROFILE_SECONDS,
+        default=60,
+    )
+    async def start_profile(
+        self, ctx: discord.ApplicationContext, duration: int
+    ):
+        """Start recording the time spent on each server and trigger, replacing the previous results."""
+
+        profiler.start(duration)
+        await ctx.respond(
+            f"Profiling for {duration} seconds, use `/debug profile stop` to see the results.",
+            ephemeral=True,
+        )
+
+    @profile_group.command(name="stop")
+    @commands.is_owner()
+    @discord.option(
+        "top",
+        description="Number of servers and triggers to show",
+        min_value=1,
+        max_value=25,
+        default=10,
+    )
+    async def stop_profile(self, ctx: discord.ApplicationContext, top: int):
+        """Stop recording and show the servers and triggers that used the most time."""
+
+        if profiler.started_at is None:
+            await ctx.respond(
+                "Nothing has been profiled yet, use `/debug profile start` first!",
+                ephemeral=True,
+            )
+            return
+
+        profiler.stop()
+
+        # The embed shows the top entries, the file has all of them
+        file = discord.File(
+            io.BytesIO(json.dumps(profiler.summary(), indent=2).encode()),
+            filename="profile.json",
+        )
+        await ctx.respond(
+            embed=self.report_embed(profiler.summary(top)),
+            file=file,
+            ephemeral=True,
+        )
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Debug())
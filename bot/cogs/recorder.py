@@ -0,0 +1,86 @@
+import os
+
+import discord
+from discord.ext import commands
+
+from bot import SHARD_IDS
+from bot.recording import EventRecorder
+
+
+class Recorder(commands.Cog):
+    """Captures the gateway events that the action executor handles, for offline replay"""
+
+    def __init__(self, recorder: EventRecorder):
+        self.recorder = recorder
+        self.recorder.open()
+
+    def cog_unload(self):
+        self.recorder.close()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if not message.guild:
+            return
+
+        self.recorder.record(
+            "MESSAGE_CREATE",
+            guild_id=message.guild.id,
+            channel_id=message.channel.id,
+            author_id=message.author.id,
+            content=message.content,
+        )
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(
+        self, payload: discord.RawReactionActionEvent
+    ):
+        self.record_reaction("MESSAGE_REACTION_ADD", payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(
+        self, payload: discord.RawReactionActionEvent
+    ):
+        self.record_reaction("MESSAGE_REACTION_REMOVE", payload)
+
+    def record_reaction(
+        self, event_type: str, payload: discord.RawReactionActionEvent
+    ):
+        if not payload.guild_id:
+            return
+
+        self.recorder.record(
+            event_type,
+            guild_id=payload.guild_id,
+            channel_id=payload.channel_id,
+            message_id=payload.message_id,
+            user_id=payload.user_id,
+            emoji_id=payload.emoji.id,
+            emoji_name=payload.emoji.name,
+        )
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        self.recorder.record(
+            "GUILD_MEMBER_ADD", guild_id=member.guild.id, user_id=member.id
+        )
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        self.recorder.record(
+            "GUILD_MEMBER_REMOVE", guild_id=member.guild.id, user_id=member.id
+        )
+
+
+def setup(bot: commands.Bot):
+    # Only loaded when a capture file is configured
+    if not (path := os.getenv("RECORD_EVENTS")):
+        return
+
+    # Each sharded process writes its own file
+    if SHARD_IDS is not None:
+        root, extension = os.path.splitext(path)
+        path = f"{root}-shard{SHARD_IDS[0]}{extension}"
+
+    recorder = EventRecorder(path, os.getenv("RECORD_REDACT", "none"))
+    bot.add_cog(Recorder(recorder))
+    print(f"Recording gateway events to {path}")
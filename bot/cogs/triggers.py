@@ -1,13 +1,26 @@
-import asyncio
-from math import ceil, floor
+import io
+from typing import Sequence
 import discord
-from discord.ext import commands, pages
+from discord.ext import commands
+from sqlalchemy import delete
+from sqlalchemy.engine import Row
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 from bot import TESTING_GUILDS, trigger_id_autocomplete
+from bot.budgets import Trip
+from bot.bulk import (
+    MAX_IMPORT_SIZE,
+    build_triggers,
+    dump_document,
+    export_document,
+    load_document,
+)
 from bot.db import async_session, models
 from bot.enums import TriggerType
+from bot.paginator import KeysetPaginator
+from bot.patterns import check_pattern
+from bot.sync import trigger_sync
 
 
 class Triggers(commands.Cog):
@@ -23,6 +36,22 @@ class Triggers(commands.Cog):
     )
     theme = discord.Color.dark_blue()
 
+    def invalidate_pattern(self, bot: discord.Bot, trigger_id: int):
+        """Drops a trigger's compiled match statement from the executor's cache"""
+
+        if executor := bot.get_cog("ActionExecutor"):
+            executor.pattern_cache.invalidate(trigger_id)  # type: ignore
+
+    def breaker_trip(
+        self, bot: discord.Bot, guild_id: int, trigger_id: int
+    ) -> Trip | None:
+        """Returns why a trigger is temporarily disabled, if it is"""
+
+        if executor := bot.get_cog("ActionExecutor"):
+            return executor.trigger_trip(guild_id, trigger_id)  # type: ignore
+
+        return None
+
     def base_response_embed(self, trigger: models.Trigger) -> discord.Embed:
         return (
             discord.Embed(
@@ -44,6 +73,12 @@ class Triggers(commands.Cog):
     ):
         """Add a trigger that executes when a new message matches the match statement. Regex can also be used."""
 
+        try:
+            analysis = check_pattern(match_statement)
+        except ValueError as e:
+            await ctx.respond(str(e), ephemeral=True)
+            return
+
         async with async_session() as session:
             new_trigger = models.Trigger(
                 guild_id=ctx.guild_id,
@@ -52,12 +87,18 @@ class Triggers(commands.Cog):
                     "match_statement": match_statement,
                     "channel_id": channel.id,
                 },
+                match_kind=analysis.kind,
+                match_cost=analysis.cost,
             )
             session.add(new_trigger)
             await session.commit()
 
+        await trigger_sync.trigger_added(new_trigger)
+        self.invalidate_pattern(ctx.bot, new_trigger.id)  # type: ignore
+
         embed = self.base_response_embed(new_trigger)
         embed.add_field(name="Match Statement", value=match_statement)
+        embed.add_field(name="Match Type", value=analysis.kind.name)
         embed.add_field(name="Channel", value=channel.mention)
 
         await ctx.respond(embed=embed)
@@ -126,6 +167,8 @@ class Triggers(commands.Cog):
             session.add(new_trigger)
             await session.commit()
 
+        await trigger_sync.trigger_added(new_trigger)
+
         embed = self.base_response_embed(new_trigger)
         embed.add_field(name="Channel", value=channel.mention)
         embed.add_field(
@@ -201,6 +244,8 @@ class Triggers(commands.Cog):
             session.add(new_trigger)
             await session.commit()
 
+        await trigger_sync.trigger_added(new_trigger)
+
         embed = self.base_response_embed(new_trigger)
         embed.add_field(name="Channel", value=channel.mention)
         embed.add_field(
@@ -230,6 +275,8 @@ class Triggers(commands.Cog):
             session.add(new_trigger)
             await session.commit()
 
+        await trigger_sync.trigger_added(new_trigger)
+
         embed = self.base_response_embed(new_trigger)
         embed.add_field(
             name="Member",
@@ -255,6 +302,8 @@ class Triggers(commands.Cog):
             session.add(new_trigger)
             await session.commit()
 
+        await trigger_sync.trigger_added(new_trigger)
+
         embed = self.base_response_embed(new_trigger)
         embed.add_field(
             name="Member",
@@ -271,48 +320,102 @@ class Triggers(commands.Cog):
         """Permanently remove a trigger and all associated actions."""
 
         async with async_session() as session:
+            # The trigger's actions are removed by the database's ON DELETE CASCADE
             query = (
-                select(models.Trigger)
+                delete(models.Trigger)
                 .where(models.Trigger.id == trigger_id)
                 .where(models.Trigger.guild_id == ctx.guild_id)
-                .options(selectinload(models.Trigger.actions))
+                .returning(models.Trigger.type)
             )
-            trigger: models.Trigger | None = await session.scalar(query)
+            trigger_type: TriggerType | None = await session.scalar(query)
+            await session.commit()
 
-            if trigger:
-                embed = discord.Embed(
-                    title="Removed Trigger",
-                    description="An existing trigger has been permanently removed, along with all actions associated with it!",
-                    color=self.theme,
-                )
-                embed.add_field(name="Trigger ID", value=str(trigger.id))
-                embed.add_field(name="Trigger Type", value=trigger.type.name)
+        if trigger_type:
+            await trigger_sync.trigger_removed(ctx.guild_id, trigger_id)  # type: ignore
+            self.invalidate_pattern(ctx.bot, trigger_id)
 
-                action_delete_tasks = [
-                    session.delete(action) for action in trigger.actions
-                ]
-                await asyncio.gather(*action_delete_tasks)
-                await session.delete(trigger)
-                await session.commit()
+            embed = discord.Embed(
+                title="Removed Trigger",
+                description="An existing trigger has been permanently removed, along with all actions associated with it!",
+                color=self.theme,
+            )
+            embed.add_field(name="Trigger ID", value=str(trigger_id))
+            embed.add_field(name="Trigger Type", value=trigger_type.name)
 
-                await ctx.respond(embed=embed)
+            await ctx.respond(embed=embed)
 
-            else:
-                await ctx.respond(
-                    f"Couldn't find any triggers with ID `{trigger_id}` in this server!",
-                    ephemeral=True,
-                )
+        else:
+            await ctx.respond(
+                f"Couldn't find any triggers with ID `{trigger_id}` in this server!",
+                ephemeral=True,
+            )
 
-    @trigger_group.command(name="list")
-    async def list_triggers(self, ctx: discord.ApplicationContext):
-        """List all the triggers in the current server"""
+    @trigger_group.command(name="import")
+    @commands.has_guild_permissions(administrator=True)
+    async def import_triggers(
+        self, ctx: discord.ApplicationContext, file: discord.Attachment
+    ):
+        """Add triggers and their actions in bulk from a JSON or YAML file made by /trigger export."""
 
         if not ctx.guild:
             return
 
+        if file.size > MAX_IMPORT_SIZE:
+            await ctx.respond(
+                f"That file is too large, the limit is {MAX_IMPORT_SIZE // 1000} KB!",
+                ephemeral=True,
+            )
+            return
+
+        try:
+            document = load_document(await file.read(), file.filename)
+            triggers = build_triggers(document, ctx.guild)
+        except ValueError as e:
+            await ctx.respond(f"Nothing was imported. {e}", ephemeral=True)
+            return
+
+        if not triggers:
+            await ctx.respond("That file has no triggers!", ephemeral=True)
+            return
+
+        # One transaction, with the triggers and then the actions each
+        # written as a batched multi-row INSERT ... RETURNING.
+        async with async_session() as session:
+            session.add_all(triggers)
+            await session.commit()
+
+        await trigger_sync.triggers_imported(ctx.guild_id, triggers)  # type: ignore
+
+        embed = discord.Embed(
+            title="Imported Triggers",
+            description="New triggers have been created from the uploaded file!",
+            color=self.theme,
+        )
+        embed.add_field(name="Triggers", value=str(len(triggers)))
+        embed.add_field(
+            name="Actions", value=str(sum(len(t.actions) for t in triggers))
+        )
+        embed.add_field(
+            name="Trigger IDs",
+            value=f"`{triggers[0].id}` to `{triggers[-1].id}`",
+        )
+
+        await ctx.respond(embed=embed)
+
+    @trigger_group.command(name="export")
+    @commands.has_guild_permissions(administrator=True)
+    @discord.option("file_format", choices=["json", "yaml"], default="json")
+    async def export_triggers(
+        self, ctx: discord.ApplicationContext, file_format: str
+    ):
+        """Download all the triggers and actions in the current server as a file that /trigger import accepts."""
+
         async with async_session() as session:
-            query = select(models.Trigger).where(
-                models.Trigger.guild_id == ctx.guild_id
+            query = (
+                select(models.Trigger)
+                .where(models.Trigger.guild_id == ctx.guild_id)
+                .order_by(models.Trigger.id)
+                .options(selectinload(models.Trigger.actions))
             )
             triggers: list[models.Trigger] = list(await session.scalars(query))
 
@@ -320,32 +423,83 @@ class Triggers(commands.Cog):
             await ctx.respond("This server has no triggers!", ephemeral=True)
             return
 
-        max_per_page = 5
-        total_pages = ceil(len(triggers) / max_per_page)
-        embeds = [
-            discord.Embed(
-                title=f"Triggers in {ctx.guild.name}", color=self.theme
-            ).set_footer(text=f"Page {i + 1} of {total_pages}")
-            for i in range(total_pages)
-        ]
-
-        for i, trigger in enumerate(triggers):
-            idx = floor(i / max_per_page)
-            params_txt = "\n".join(
-                [
-                    f"{key.replace('_', ' ').title()}: `{value}`"
-                    for key, value in trigger.activation_params.items()
-                ]
-            )
+        content = dump_document(export_document(triggers), file_format)
+        file = discord.File(
+            io.BytesIO(content), filename=f"triggers.{file_format}"
+        )
 
-            embeds[idx].add_field(
-                name=f"Trigger ID: {trigger.id}",
-                value=f"Type: `{trigger.type.name}`\n{params_txt}",
-                inline=False,
+        await ctx.respond(
+            f"Exported {len(triggers)} triggers from this server.", file=file
+        )
+
+    @trigger_group.command(name="list")
+    @discord.option(
+        "trigger_type", choices=[t.name for t in TriggerType], default=None
+    )
+    async def list_triggers(
+        self,
+        ctx: discord.ApplicationContext,
+        trigger_type: str | None,
+        channel: discord.TextChannel | None,
+    ):
+        """List the triggers in the current server, optionally only those of one type or in one channel"""
+
+        if not ctx.guild:
+            return
+
+        guild_name = ctx.guild.name
+        query = select(models.Trigger.__table__).where(
+            models.Trigger.guild_id == ctx.guild_id
+        )
+
+        if trigger_type:
+            query = query.where(
+                models.Trigger.type == TriggerType[trigger_type]
             )
+        if channel:
+            query = query.where(models.Trigger.channel_id == channel.id)
+
+        def render(triggers: Sequence[Row], page: int) -> discord.Embed:
+            embed = discord.Embed(
+                title=f"Triggers in {guild_name}", color=self.theme
+            ).set_footer(text=f"Page {page + 1}")
+
+            for trigger in triggers:
+                params_txt = "\n".join(
+                    [
+                        f"{key.replace('_', ' ').title()}: `{value}`"
+                        for key, value in trigger.activation_params.items()
+                    ]
+                )
+
+                status_txt = ""
+
+                if trip := self.breaker_trip(
+                    ctx.bot, trigger.guild_id, trigger.id
+                ):
+                    status_txt = f"\n**Disabled** until <t:{int(trip.until)}:t>, {trip.reason}"
+
+                embed.add_field(
+                    name=f"Trigger ID: {trigger.id}",
+                    value=f"Type: `{trigger.type.name}`\n{params_txt}{status_txt}",
+                    inline=False,
+                )
 
-        paginator = pages.Paginator(embeds)  # type: ignore
-        await paginator.respond(ctx.interaction)
+            return embed
+
+        paginator = KeysetPaginator(
+            query, models.Trigger.id, render, ctx.author.id  # type: ignore
+        )
+
+        if not await paginator.respond(ctx):
+            await ctx.respond(
+                (
+                    "This server has no matching triggers!"
+                    if trigger_type or channel
+                    else "This server has no triggers!"
+                ),
+                ephemeral=True,
+            )
 
 
 def setup(bot: commands.Bot):
@@ -1,32 +1,99 @@
 import os
+from typing import Any, Sequence
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import Executable
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncEngine,
     AsyncSession,
 )
 
-_engine: AsyncEngine
-_async_session_maker: sessionmaker
+# Set by init_engine()
+_engine: AsyncEngine = None  # type: ignore
+_async_session_maker: sessionmaker = None  # type: ignore
 
 
-def init_engine():
+def _option(value: Any, name: str, cast: type) -> Any:
+    """Returns value if given, otherwise the environment variable called name"""
+
+    if value is not None or (env_value := os.getenv(name)) is None:
+        return value
+
+    if cast is bool:
+        return env_value.lower() in ("1", "true", "yes")
+
+    return cast(env_value)
+
+
+def init_engine(
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_pre_ping: bool | None = None,
+    pool_recycle: int | None = None,
+    statement_cache_size: int | None = None,
+    statement_timeout: int | None = None,
+):
+    """Creates the database engine. Pool options that aren't passed in are
+    read from the DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE and DB_STATEMENT_TIMEOUT
+    (milliseconds) environment variables, falling back to SQLAlchemy's defaults.
+    """
+
     global _engine, _async_session_maker
 
-    if db_uri := os.getenv("DB_URI"):
-        _engine = create_async_engine(db_uri)
-        _async_session_maker = sessionmaker(
-            _engine, class_=AsyncSession, expire_on_commit=False
-        )
-    else:
+    if not (db_uri := os.getenv("DB_URI")):
         raise Exception("Expected DB_URI variable in environment, not found!")
 
+    engine_options: dict[str, Any] = {
+        "pool_size": _option(pool_size, "DB_POOL_SIZE", int),
+        "max_overflow": _option(max_overflow, "DB_MAX_OVERFLOW", int),
+        "pool_pre_ping": _option(pool_pre_ping, "DB_POOL_PRE_PING", bool),
+        "pool_recycle": _option(pool_recycle, "DB_POOL_RECYCLE", int),
+    }
+    engine_options = {k: v for k, v in engine_options.items() if v is not None}
+
+    statement_cache_size = _option(
+        statement_cache_size, "DB_STATEMENT_CACHE_SIZE", int
+    )
+    statement_timeout = _option(statement_timeout, "DB_STATEMENT_TIMEOUT", int)
+
+    # Both of these are asyncpg connection options
+    if "asyncpg" in db_uri:
+        connect_args: dict[str, Any] = {}
+
+        if statement_cache_size is not None:
+            connect_args["statement_cache_size"] = statement_cache_size
+        if statement_timeout is not None:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(statement_timeout)
+            }
+
+        engine_options["connect_args"] = connect_args
+
+    _engine = create_async_engine(db_uri, **engine_options)
+    _async_session_maker = sessionmaker(
+        _engine, class_=AsyncSession, expire_on_commit=False
+    )
+
 
 async def deinit_engine():
     global _engine
     await _engine.dispose()
 
 
+def get_engine() -> AsyncEngine:
+    return _engine
+
+
 def async_session() -> AsyncSession:
     global _async_session_maker
     return _async_session_maker()  # type: ignore
+
+
+async def fetch_rows(query: Executable) -> Sequence[Row]:
+    """Runs a read-only query on a plain connection, skipping the ORM session and identity map"""
+
+    async with _engine.connect() as connection:
+        result = await connection.execute(query)
+        return result.all()
@@ -0,0 +1,63 @@
+"""typed activation param columns
+
+Revision ID: 014bd6914277
+Revises: 61ac71a011b8
+Create Date: 2026-10-17 11:47:05.902114
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "014bd6914277"
+down_revision = "61ac71a011b8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("triggers", sa.Column("channel_id", sa.BigInteger()))
+    op.add_column("triggers", sa.Column("message_id", sa.BigInteger()))
+    op.add_column("triggers", sa.Column("member_id", sa.BigInteger()))
+    op.add_column("triggers", sa.Column("emoji", sa.Text()))
+    op.add_column("triggers", sa.Column("match_statement", sa.Text()))
+    op.add_column("actions", sa.Column("channel_id", sa.BigInteger()))
+
+    op.execute("""
+        UPDATE triggers SET
+            channel_id = (activation_params->>'channel_id')::bigint,
+            message_id = (activation_params->>'message_id')::bigint,
+            member_id = (activation_params->>'member_id')::bigint,
+            emoji = activation_params->>'emoji',
+            match_statement = activation_params->>'match_statement'
+        """)
+    op.execute("""
+        UPDATE actions SET
+            channel_id = (action_params->>'channel_id')::bigint
+        """)
+
+    # The message_id column replaces the expression index on the JSON value
+    op.drop_index("ix_triggers_message_id", table_name="triggers")
+    op.create_index("ix_triggers_channel_id", "triggers", ["channel_id"])
+    op.create_index("ix_triggers_message_id", "triggers", ["message_id"])
+    op.create_index("ix_triggers_member_id", "triggers", ["member_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_triggers_member_id", table_name="triggers")
+    op.drop_index("ix_triggers_message_id", table_name="triggers")
+    op.drop_index("ix_triggers_channel_id", table_name="triggers")
+    op.create_index(
+        "ix_triggers_message_id",
+        "triggers",
+        [sa.text("((activation_params->>'message_id')::bigint)")],
+        postgresql_where=sa.text("type IN ('ReactionAdd', 'ReactionRemove')"),
+    )
+
+    op.drop_column("actions", "channel_id")
+    op.drop_column("triggers", "match_statement")
+    op.drop_column("triggers", "emoji")
+    op.drop_column("triggers", "member_id")
+    op.drop_column("triggers", "message_id")
+    op.drop_column("triggers", "channel_id")
@@ -0,0 +1,39 @@
+"""trigger lookup indexes
+
+Revision ID: 61ac71a011b8
+Revises: fc174d28712a
+Create Date: 2026-10-17 10:12:40.318562
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "61ac71a011b8"
+down_revision = "fc174d28712a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_triggers_guild_id_type", "triggers", ["guild_id", "type"]
+    )
+    op.create_index("ix_actions_trigger_id", "actions", ["trigger_id"])
+    op.create_index("ix_actions_guild_id", "actions", ["guild_id"])
+
+    # Reaction triggers are looked up by the message they watch
+    op.create_index(
+        "ix_triggers_message_id",
+        "triggers",
+        [sa.text("((activation_params->>'message_id')::bigint)")],
+        postgresql_where=sa.text("type IN ('ReactionAdd', 'ReactionRemove')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_triggers_message_id", table_name="triggers")
+    op.drop_index("ix_actions_guild_id", table_name="actions")
+    op.drop_index("ix_actions_trigger_id", table_name="actions")
+    op.drop_index("ix_triggers_guild_id_type", table_name="triggers")
@@ -0,0 +1,34 @@
+"""match statement classification
+
+Revision ID: 7d2e5c9a4b13
+Revises: 014bd6914277
+Create Date: 2026-10-17 20:14:38.512870
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7d2e5c9a4b13"
+down_revision = "014bd6914277"
+branch_labels = None
+depends_on = None
+
+match_kind = sa.Enum("Literal", "Prefix", "Regex", name="matchkind")
+
+
+def upgrade() -> None:
+    match_kind.create(op.get_bind())
+    op.add_column("triggers", sa.Column("match_kind", match_kind))
+    op.add_column("triggers", sa.Column("match_cost", sa.Integer()))
+
+    # Not backfilled: existing triggers are left unclassified (NULL) and
+    # classified when the matcher loads them. A backfill calling the current
+    # analyser would store different values as its cost weights change.
+
+
+def downgrade() -> None:
+    op.drop_column("triggers", "match_cost")
+    op.drop_column("triggers", "match_kind")
+    match_kind.drop(op.get_bind())
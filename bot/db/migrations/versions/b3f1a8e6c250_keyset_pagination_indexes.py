@@ -0,0 +1,25 @@
+"""keyset pagination indexes
+
+Revision ID: b3f1a8e6c250
+Revises: 7d2e5c9a4b13
+Create Date: 2026-10-17 21:02:11.730945
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b3f1a8e6c250"
+down_revision = "7d2e5c9a4b13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_triggers_guild_id_id", "triggers", ["guild_id", "id"])
+    op.create_index("ix_actions_guild_id_id", "actions", ["guild_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_actions_guild_id_id", table_name="actions")
+    op.drop_index("ix_triggers_guild_id_id", table_name="triggers")
@@ -1,31 +1,78 @@
-from sqlalchemy import JSON, Column, BigInteger, Enum, ForeignKey
+from sqlalchemy import (
+    JSON,
+    Column,
+    BigInteger,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    Text,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 
-from bot.enums import ActionType, TriggerType
+from bot.enums import ActionType, MatchKind, TriggerType
 
 Base = declarative_base()
 
 
 class Trigger(Base):
     __tablename__ = "triggers"
+    __table_args__ = (
+        Index("ix_triggers_guild_id_type", "guild_id", "type"),
+        # Keyset pagination of a guild's triggers
+        Index("ix_triggers_guild_id_id", "guild_id", "id"),
+    )
 
     id = Column(BigInteger, primary_key=True, auto_increment=True)
     guild_id = Column(BigInteger, nullable=False)
     type = Column(Enum(TriggerType), nullable=False)
     activation_params = Column(JSON, nullable=False)
-    actions = relationship("Action", back_populates="trigger")
+    # Actions are removed by the ON DELETE CASCADE on actions.trigger_id
+    actions = relationship(
+        "Action", back_populates="trigger", passive_deletes=True
+    )
+
+    # Copies of the activation parameters that events are filtered by,
+    # kept in sync with activation_params so they can be queried directly.
+    channel_id = Column(BigInteger, index=True)
+    message_id = Column(BigInteger, index=True)
+    member_id = Column(BigInteger, index=True)
+    emoji = Column(Text)
+    match_statement = Column(Text)
+
+    # Set from bot.patterns.analyse_pattern when a Message trigger is created
+    match_kind = Column(Enum(MatchKind))
+    match_cost = Column(Integer)
+
+    @validates("activation_params")
+    def denormalise_activation_params(self, _, params: dict) -> dict:
+        self.channel_id = params.get("channel_id")
+        self.message_id = params.get("message_id")
+        self.member_id = params.get("member_id")
+        self.emoji = params.get("emoji")
+        self.match_statement = params.get("match_statement")
+        return params
 
 
 class Action(Base):
     __tablename__ = "actions"
+    __table_args__ = (Index("ix_actions_guild_id_id", "guild_id", "id"),)
 
     id = Column(BigInteger, primary_key=True, auto_increment=True)
-    guild_id = Column(BigInteger, nullable=False)
+    guild_id = Column(BigInteger, nullable=False, index=True)
     type = Column(Enum(ActionType), nullable=False)
     action_params = Column(JSON, nullable=False)
+    channel_id = Column(BigInteger)
 
     trigger_id = Column(
-        ForeignKey("triggers.id", ondelete="CASCADE"), nullable=False
+        ForeignKey("triggers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
     trigger = relationship("Trigger", back_populates="actions")
+
+    @validates("action_params")
+    def denormalise_action_params(self, _, params: dict) -> dict:
+        self.channel_id = params.get("channel_id")
+        return params
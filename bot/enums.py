@@ -45,3 +45,10 @@ class ActionType(enum.Enum):
     MessageDelete = "message_delete"
     ReactionAdd = "reaction_add"
     ReactionRemove = "reaction_remove"
+
+
+class MatchKind(enum.Enum):
+    # How a Message trigger's match statement is evaluated, from cheapest to most expensive
+    Literal = "literal"
+    Prefix = "prefix"
+    Regex = "regex"
@@ -0,0 +1,271 @@
+import time
+import asyncio
+import traceback
+from collections import deque
+from typing import Awaitable, Callable, NamedTuple
+
+import discord
+
+from bot import metrics
+from bot.records import CompiledAction, CompiledTrigger
+from bot.templates import TemplateContext
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+MAX_MESSAGE_LENGTH = 2000
+
+
+class ActionJob(NamedTuple):
+    trigger: CompiledTrigger
+    action: CompiledAction
+    context: TemplateContext
+
+
+class ActionQueue:
+    """Bounded queue of matched actions, executed by a fixed pool of worker tasks
+
+    When the queue is full, the overflow policy decides what happens to a new job:
+    "block" waits for space (backpressure), "drop_newest" discards the new job and
+    "drop_oldest" discards the job that has been waiting the longest.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[ActionJob], Awaitable],
+        workers: int = 8,
+        max_size: int = 1000,
+        overflow: str = "block",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise Exception(
+                f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}"
+            )
+
+        self.execute = execute
+        self.workers = workers
+        self.max_size = max_size
+        self.overflow = overflow
+        self.dropped = 0
+
+        self._queue: asyncio.Queue[ActionJob] | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        # Jobs waiting in the queue for each guild
+        self._queued: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def queued(self, guild_id: int) -> int:
+        """Returns the number of a guild's jobs that are waiting to be executed"""
+
+        return self._queued.get(guild_id, 0)
+
+    def _dequeued(self, job: ActionJob):
+        guild_id = job.trigger.guild_id
+
+        if (count := self._queued.get(guild_id, 0) - 1) > 0:
+            self._queued[guild_id] = count
+        else:
+            self._queued.pop(guild_id, None)
+
+    def start(self):
+        """Starts the worker tasks, must be called from within a running event loop"""
+
+        if self._worker_tasks:
+            return
+
+        self._queue = asyncio.Queue(self.max_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+
+        self._worker_tasks.clear()
+        self._queue = None
+        self._queued.clear()
+
+    async def submit(self, job: ActionJob) -> bool:
+        """Enqueues a job according to the overflow policy, returns False if a job was dropped"""
+
+        if self._queue is None:
+            self.start()
+
+        queue: asyncio.Queue[ActionJob] = self._queue  # type: ignore
+        guild_id = job.trigger.guild_id
+
+        if self.overflow == "block":
+            await queue.put(job)
+            self._queued[guild_id] = self._queued.get(guild_id, 0) + 1
+            return True
+
+        try:
+            queue.put_nowait(job)
+            self._queued[guild_id] = self._queued.get(guild_id, 0) + 1
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+            if self.overflow == "drop_newest":
+                return False
+
+        self._dequeued(queue.get_nowait())
+        queue.task_done()
+        queue.put_nowait(job)
+        self._queued[guild_id] = self._queued.get(guild_id, 0) + 1
+        return False
+
+    async def join(self):
+        """Waits until every queued job has been executed"""
+
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self):
+        queue: asyncio.Queue[ActionJob] = self._queue  # type: ignore
+
+        while True:
+            job = await queue.get()
+            self._dequeued(job)
+
+            try:
+                await self.execute(job)
+            except Exception:
+                print(
+                    f"Error while executing action {job.action.id} of trigger {job.trigger.id}:"
+                )
+                traceback.print_exc()
+            finally:
+                queue.task_done()
+
+
+class SendScheduler:
+    """Sends messages through one paced queue per channel, so that a busy channel can't hold up the others
+
+    Each channel is paced locally to `rate` messages per `per` seconds. Every
+    send still goes through py-cord's HTTP client, which applies Discord's rate
+    limits and retries 429 responses itself.
+    """
+
+    def __init__(
+        self,
+        rate: int = 5,
+        per: float = 5.0,
+        max_pending: int = 50,
+        coalesce: bool = False,
+    ):
+        self.rate = rate
+        self.per = per
+        self.max_pending = max_pending
+        self.coalesce = coalesce
+        self.dropped = 0
+
+        self._pending: dict[int, deque[str]] = {}
+        self._sent_at: dict[int, deque[float]] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def send(self, channel: discord.abc.Messageable, content: str) -> bool:
+        """Queues a message for a channel, returns False if the channel's queue is full"""
+
+        channel_id: int = channel.id  # type: ignore
+        pending = self._pending.setdefault(channel_id, deque())
+
+        if len(pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+
+        pending.append(content)
+
+        if channel_id not in self._tasks:
+            self._tasks[channel_id] = asyncio.create_task(
+                self._channel_sender(channel)
+            )
+
+        return True
+
+    def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+        self._tasks.clear()
+        self._pending.clear()
+        self._sent_at.clear()
+
+    async def join(self):
+        """Waits until every queued message has been sent"""
+
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values())
+
+    async def _wait_for_slot(self, channel_id: int):
+        sent_at = self._sent_at.setdefault(channel_id, deque(maxlen=self.rate))
+
+        if len(sent_at) == self.rate:
+            if (delay := sent_at[0] + self.per - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+
+        sent_at.append(time.monotonic())
+
+    def _forget(self, channel_id: int):
+        """Drops the send times of a channel that has gone idle"""
+
+        if channel_id in self._tasks:
+            return
+
+        sent_at = self._sent_at.get(channel_id)
+
+        # Kept until they no longer affect the pacing of the next send
+        if (
+            sent_at
+            and (delay := sent_at[-1] + self.per - time.monotonic()) > 0
+        ):
+            asyncio.get_running_loop().call_later(
+                delay, self._forget, channel_id
+            )
+        else:
+            self._sent_at.pop(channel_id, None)
+
+    def _next_content(self, pending: deque[str]) -> str:
+        content = pending.popleft()
+
+        if not self.coalesce:
+            return content
+
+        while (
+            pending
+            and len(content) + 1 + len(pending[0]) <= MAX_MESSAGE_LENGTH
+        ):
+            content += "\n" + pending.popleft()
+
+        return content
+
+    async def _channel_sender(self, channel: discord.abc.Messageable):
+        channel_id: int = channel.id  # type: ignore
+        pending = self._pending[channel_id]
+
+        try:
+            while pending:
+                await self._wait_for_slot(channel_id)
+                content = self._next_content(pending)
+
+                start = time.perf_counter()
+
+                try:
+                    await channel.send(content)
+                    metrics.send_seconds.observe(time.perf_counter() - start)
+                except discord.HTTPException as e:
+                    # Including 429s that py-cord gave up retrying
+                    metrics.send_errors.inc(str(e.status))
+                    print(f"Failed to send a message in {channel_id}: {e}")
+                except Exception:
+                    # e.g. a connection error or timeout, which mustn't end
+                    # the task and strand the channel's other messages
+                    print(f"Failed to send a message in {channel_id}:")
+                    traceback.print_exc()
+        finally:
+            self._tasks.pop(channel_id, None)
+
+            if not pending:
+                self._pending.pop(channel_id, None)
+                self._forget(channel_id)
@@ -0,0 +1,366 @@
+import re
+import time
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.pool import Pool
+
+from bot import metrics
+from bot.enums import MatchKind, TriggerType
+from bot.patterns import EXPENSIVE_COST, analyse_pattern, literal_prefix
+from bot.records import CompiledTrigger
+from bot.registry import trigger_registry
+
+
+class PatternCache:
+    """LRU cache of compiled match statements, keyed by trigger ID and pattern text"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._patterns: OrderedDict[int, tuple[str, re.Pattern]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def get(self, trigger_id: int, pattern: str) -> re.Pattern:
+        """Returns the compiled pattern for a trigger, compiling it on a miss"""
+
+        entry = self._patterns.get(trigger_id)
+
+        if entry is not None and entry[0] == pattern:
+            self._patterns.move_to_end(trigger_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        compiled = re.compile(pattern)
+        self._patterns[trigger_id] = (pattern, compiled)
+        self._patterns.move_to_end(trigger_id)
+
+        while len(self._patterns) > self.max_size:
+            self._patterns.popitem(last=False)
+
+        return compiled
+
+    def invalidate(self, trigger_id: int):
+        self._patterns.pop(trigger_id, None)
+
+    def clear(self):
+        self._patterns.clear()
+
+
+def is_combinable(pattern: str) -> bool:
+    """Returns whether a pattern can safely be placed inside a larger alternation"""
+
+    try:
+        compiled = re.compile(pattern)
+    except re.error:
+        return False
+
+    # Groups would shift the branch numbering and inline flags
+    # would leak into the other branches of the alternation.
+    return compiled.groups == 0 and compiled.flags == re.UNICODE
+
+
+def _pool_fullmatch(pattern: str, content: str) -> bool:
+    return re.fullmatch(pattern, content) is not None
+
+
+class RegexPool:
+    """Evaluates expensive match statements in worker processes with a time budget per match
+
+    At most `workers` matches are submitted at once, so that the time budget
+    only counts a match while a worker is running it, never while it waits for
+    a free worker. A trigger whose pattern runs out of time too many times is
+    disabled for `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 0.25,
+        max_timeouts: int = 3,
+        cooldown: float = 300.0,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_timeouts = max_timeouts
+        self.cooldown = cooldown
+        # Trigger ID: when it's enabled again (a Unix timestamp)
+        self.disabled: dict[int, float] = {}
+
+        self._timeouts: dict[int, int] = {}
+        self._pool: Pool | None = None
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(workers)
+        # Matches running in the current pool, resolved with None if it's
+        # replaced before they finish
+        self._running: set[asyncio.Future] = set()
+        self._generation = 0
+
+    def _submit(
+        self, pool: Pool, pattern: str, content: str
+    ) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[bool] = loop.create_future()
+
+        def resolve(result: bool):
+            if not future.done():
+                future.set_result(result)
+
+        pool.apply_async(
+            _pool_fullmatch,
+            (pattern, content),
+            callback=lambda r: loop.call_soon_threadsafe(resolve, r),
+            error_callback=lambda _: loop.call_soon_threadsafe(resolve, False),
+        )
+        return future
+
+    async def _get_pool(self) -> Pool:
+        async with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context("spawn")
+                pool = await asyncio.to_thread(context.Pool, self.workers)
+
+                # Spawned workers take a while to start, which mustn't be
+                # counted against the time budget of the first matches.
+                await asyncio.gather(
+                    *(self._submit(pool, "", "") for _ in range(self.workers))
+                )
+                self._pool = pool
+
+            return self._pool
+
+    def disabled_until(self, trigger_id: int) -> float | None:
+        """Returns when a disabled trigger is enabled again, None if it isn't disabled"""
+
+        if (until := self.disabled.get(trigger_id)) is None:
+            return None
+
+        if until <= time.time():
+            del self.disabled[trigger_id]
+            self._timeouts.pop(trigger_id, None)
+            return None
+
+        return until
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    async def fullmatch(
+        self, trigger_id: int, pattern: str, content: str
+    ) -> bool:
+        if self.disabled and self.disabled_until(trigger_id):
+            return False
+
+        while True:
+            async with self._slots:
+                pool = await self._get_pool()
+                generation = self._generation
+                future = self._submit(pool, pattern, content)
+                self._running.add(future)
+
+                try:
+                    result = await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    if generation == self._generation:
+                        await self._restart()
+                        self._record_timeout(trigger_id)
+
+                    return False
+                finally:
+                    self._running.discard(future)
+
+            # Cut short by a restart caused by another pattern, which
+            # doesn't count against this trigger, so the match is retried.
+            if result is not None:
+                return result
+
+    async def _restart(self):
+        """Replaces the pool, killing the process stuck on a runaway match"""
+
+        self._generation += 1
+        pool, self._pool = self._pool, None
+
+        for future in self._running:
+            if not future.done():
+                future.set_result(None)
+
+        if pool is not None:
+            await asyncio.to_thread(pool.terminate)
+
+    def _record_timeout(self, trigger_id: int):
+        timeouts = self._timeouts.get(trigger_id, 0) + 1
+        self._timeouts[trigger_id] = timeouts
+
+        if timeouts >= self.max_timeouts:
+            self.disabled[trigger_id] = time.time() + self.cooldown
+            metrics.breaker_trips.inc("trigger", "regex_timeouts")
+            print(
+                f"Disabled trigger {trigger_id} for {self.cooldown:g} seconds, its match statement timed out {timeouts} times"
+            )
+
+
+class ChannelMatcher:
+    """Matches message content against all Message triggers of a single channel in roughly one pass"""
+
+    def __init__(
+        self,
+        triggers: list[CompiledTrigger],
+        pattern_cache: PatternCache,
+        offload_expensive: bool = False,
+    ):
+        self.pattern_cache = pattern_cache
+        self.size = len(triggers)
+        self.literals: dict[str, list[CompiledTrigger]] = {}
+        self.branches: list[CompiledTrigger] = []
+        self.others: list[CompiledTrigger] = []
+        # Only checked once the content is known to start with the prefix
+        self.prefixed: list[tuple[str, CompiledTrigger]] = []
+        # Left for the caller to evaluate outside of the event loop
+        self.expensive: list[CompiledTrigger] = []
+
+        for trigger in triggers:
+            pattern: str = trigger.match_statement  # type: ignore
+            kind, cost = trigger.match_kind, trigger.match_cost
+
+            # Triggers created before patterns were classified
+            if kind is None or cost is None:
+                try:
+                    kind, cost, _ = analyse_pattern(pattern)
+                except ValueError:
+                    continue
+
+            if kind == MatchKind.Literal:
+                self.literals.setdefault(literal_prefix(pattern), []).append(
+                    trigger
+                )
+            elif offload_expensive and cost >= EXPENSIVE_COST:
+                self.expensive.append(trigger)
+            elif kind == MatchKind.Prefix:
+                self.prefixed.append((literal_prefix(pattern), trigger))
+            elif is_combinable(pattern):
+                self.branches.append(trigger)
+            else:
+                self.others.append(trigger)
+
+        if self.branches:
+            self.combined: re.Pattern | None = re.compile(
+                "|".join(f"({t.match_statement})" for t in self.branches)
+            )
+        else:
+            self.combined = None
+
+    def match(self, content: str) -> list[CompiledTrigger]:
+        """Returns every trigger whose match statement fully matches the content"""
+
+        matched = list(self.literals.get(content, ()))
+
+        if self.combined is not None and (
+            result := self.combined.fullmatch(content)
+        ):
+            # Branches before the reported one are guaranteed not to
+            # match, so only the remaining ones need to be checked.
+            first: int = result.lastindex  # type: ignore
+            matched.append(self.branches[first - 1])
+            matched.extend(
+                t for t in self.branches[first:] if self._fullmatch(t, content)
+            )
+
+        matched.extend(
+            t
+            for prefix, t in self.prefixed
+            if content.startswith(prefix) and self._fullmatch(t, content)
+        )
+        matched.extend(t for t in self.others if self._fullmatch(t, content))
+        matched.sort(key=lambda t: t.id)
+        return matched
+
+    def _fullmatch(self, trigger: CompiledTrigger, content: str) -> bool:
+        pattern: str = trigger.match_statement  # type: ignore
+
+        try:
+            compiled = self.pattern_cache.get(trigger.id, pattern)
+        except re.error:
+            return False
+
+        return compiled.fullmatch(content) is not None
+
+
+class MessageMatcher:
+    """Per-guild collection of channel matchers, rebuilt whenever the guild's Message triggers change"""
+
+    def __init__(
+        self, pattern_cache: PatternCache, regex_pool: RegexPool | None = None
+    ):
+        self.pattern_cache = pattern_cache
+        self.regex_pool = regex_pool
+        self._guilds: dict[int, tuple[int, dict[int, ChannelMatcher]]] = {}
+
+    async def match(
+        self, guild_id: int, channel_id: int, content: str
+    ) -> tuple[list[CompiledTrigger], float]:
+        """Returns every Message trigger in a channel that matches the content,
+        and the CPU seconds spent matching in this thread (excluding the regex pool)
+        """
+
+        start = time.thread_time()
+        version = trigger_registry.get_version(guild_id, TriggerType.Message)
+        entry = self._guilds.get(guild_id)
+
+        if entry is None or entry[0] != version:
+            entry = (version, self._build(guild_id))
+            self._guilds[guild_id] = entry
+
+        if not (matcher := entry[1].get(channel_id)):
+            return [], time.thread_time() - start
+
+        matched = matcher.match(content)
+        cpu_seconds = time.thread_time() - start
+
+        if matcher.expensive and self.regex_pool:
+            results = await asyncio.gather(
+                *(
+                    self.regex_pool.fullmatch(
+                        t.id, t.match_statement, content  # type: ignore
+                    )
+                    for t in matcher.expensive
+                )
+            )
+            matched.extend(
+                t for t, result in zip(matcher.expensive, results) if result
+            )
+            matched.sort(key=lambda t: t.id)
+
+        return matched, cpu_seconds
+
+    def count(self, guild_id: int, channel_id: int) -> int:
+        """Returns how many triggers content in a channel was last matched against"""
+
+        if entry := self._guilds.get(guild_id):
+            if matcher := entry[1].get(channel_id):
+                return matcher.size
+
+        return 0
+
+    def _build(self, guild_id: int) -> dict[int, ChannelMatcher]:
+        channel_triggers: dict[int, list[CompiledTrigger]] = {}
+
+        for trigger in trigger_registry.get_triggers(
+            guild_id, TriggerType.Message
+        ):
+            channel_id: int = trigger.channel_id  # type: ignore
+            channel_triggers.setdefault(channel_id, []).append(trigger)
+
+        return {
+            channel_id: ChannelMatcher(
+                triggers, self.pattern_cache, self.regex_pool is not None
+            )
+            for channel_id, triggers in channel_triggers.items()
+        }
@@ -0,0 +1,269 @@
+import os
+from bisect import bisect_left
+from typing import Callable, TypeVar
+
+from aiohttp import web
+
+# Upper bounds in seconds, from sub-millisecond matching up to slow HTTP calls
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Counter:
+    """Monotonically increasing value for each combination of label values"""
+
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Histogram:
+    """Distribution of observed values for each combination of label values"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label values: a count for each bucket plus +Inf, and the sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if (entry := self._values.get(labels)) is None:
+            entry = self._values[labels] = (
+                [0] * (len(self.buckets) + 1),
+                [0.0],
+            )
+
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def collect(self) -> list[str]:
+        lines = []
+        bucket_labels = (*self.labelnames, "le")
+
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels, (*labels, str(bound)))} {cumulative}"
+                )
+
+            label_txt = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_txt} {total[0]}")
+            lines.append(f"{self.name}_count{label_txt} {cumulative}")
+
+        return lines
+
+
+class Gauge:
+    """Value read from a callback whenever the metrics are scraped"""
+
+    type = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, function: Callable[[], float]
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def collect(self) -> list[str]:
+        return [f"{self.name} {self.function()}"]
+
+
+Metric = Counter | Histogram | Gauge
+M = TypeVar("M", Counter, Histogram, Gauge)
+
+
+class MetricsRegistry:
+    """Collection of metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Adds a metric, replacing any other one with the same name"""
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the metrics registry on /metrics over HTTP"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, _request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+
+metrics_registry = MetricsRegistry()
+metrics_server = MetricsServer(metrics_registry)
+
+# Only served when METRICS_PORT is set, on METRICS_HOST (localhost by default)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+events = metrics_registry.register(
+    Counter(
+        "automic_events_total",
+        "Gateway events received by the action executor",
+        ("trigger_type",),
+    )
+)
+triggers_evaluated = metrics_registry.register(
+    Counter(
+        "automic_triggers_evaluated_total",
+        "Triggers that were checked against an event",
+        ("trigger_type",),
+    )
+)
+trigger_matches = metrics_registry.register(
+    Counter(
+        "automic_trigger_matches_total",
+        "Triggers that matched an event",
+        ("trigger_type",),
+    )
+)
+actions_executed = metrics_registry.register(
+    Counter(
+        "automic_actions_executed_total",
+        "Actions that were executed",
+        ("trigger_type", "action_type"),
+    )
+)
+action_errors = metrics_registry.register(
+    Counter(
+        "automic_action_errors_total",
+        "Actions that raised an error while executing",
+        ("trigger_type", "action_type"),
+    )
+)
+send_errors = metrics_registry.register(
+    Counter(
+        "automic_send_errors_total",
+        "Messages that Discord refused, by HTTP status",
+        ("status",),
+    )
+)
+breaker_trips = metrics_registry.register(
+    Counter(
+        "automic_breaker_trips_total",
+        "Circuit breakers tripped by a trigger or guild exceeding its budget",
+        ("scope", "budget"),
+    )
+)
+event_seconds = metrics_registry.register(
+    Histogram(
+        "automic_event_seconds",
+        "Time spent handling an event that matched triggers, until its actions are queued",
+        ("trigger_type",),
+    )
+)
+match_seconds = metrics_registry.register(
+    Histogram(
+        "automic_match_seconds",
+        "Time spent finding the triggers that match an event, including regex matching",
+        ("trigger_type",),
+    )
+)
+render_seconds = metrics_registry.register(
+    Histogram(
+        "automic_render_seconds",
+        "Time spent rendering message templates",
+        ("trigger_type",),
+    )
+)
+action_seconds = metrics_registry.register(
+    Histogram(
+        "automic_action_seconds",
+        "Time spent executing an action",
+        ("trigger_type", "action_type"),
+    )
+)
+send_seconds = metrics_registry.register(
+    Histogram(
+        "automic_send_seconds",
+        "Latency of channel.send calls made by the send scheduler",
+    )
+)
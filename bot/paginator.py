@@ -0,0 +1,98 @@
+from typing import Callable, Sequence
+
+import discord
+from sqlalchemy import Column
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
+
+from bot.db import fetch_rows
+
+
+class KeysetPaginator(discord.ui.View):
+    """Paginator that only fetches and renders a page when it's shown
+
+    Pages are selected with keyset pagination (WHERE id > last_id LIMIT n)
+    instead of OFFSET, so each page is a single index range scan no matter
+    how far into the results it is.
+    """
+
+    def __init__(
+        self,
+        query: Select,
+        id_column: Column,
+        render: Callable[[Sequence[Row], int], discord.Embed],
+        author_id: int,
+        per_page: int = 5,
+    ):
+        super().__init__(timeout=180, disable_on_timeout=True)
+        self.query = query
+        self.id_column = id_column
+        self.render = render
+        self.author_id = author_id
+        self.per_page = per_page
+
+        # The last ID before each page that has been shown, a
+        # stack that grows as the user moves forward.
+        self._cursors: list[int] = [0]
+        self._rows: Sequence[Row] = ()
+        self._has_next = False
+
+    @property
+    def page(self) -> int:
+        return len(self._cursors) - 1
+
+    async def _fetch(self):
+        query = (
+            self.query.where(self.id_column > self._cursors[-1])
+            .order_by(self.id_column)
+            .limit(self.per_page + 1)
+        )
+        rows = await fetch_rows(query)
+
+        # The extra row only tells whether there is another page
+        self._has_next = len(rows) > self.per_page
+        self._rows = rows[: self.per_page]
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = not self._has_next
+
+    async def _show(self, interaction: discord.Interaction):
+        await self._fetch()
+        await interaction.response.edit_message(
+            embed=self.render(self._rows, self.page), view=self
+        )
+
+    async def respond(self, ctx: discord.ApplicationContext) -> bool:
+        """Shows the first page, returns False without responding if there are no results"""
+
+        await self._fetch()
+
+        if not self._rows:
+            return False
+
+        await ctx.respond(embed=self.render(self._rows, self.page), view=self)
+        return True
+
+    async def interaction_check(
+        self, interaction: discord.Interaction
+    ) -> bool:
+        return interaction.user is not None and (
+            interaction.user.id == self.author_id
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(
+        self, _button: discord.ui.Button, interaction: discord.Interaction
+    ):
+        if len(self._cursors) > 1:
+            self._cursors.pop()
+
+        await self._show(interaction)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_button(
+        self, _button: discord.ui.Button, interaction: discord.Interaction
+    ):
+        if self._rows:
+            self._cursors.append(getattr(self._rows[-1], self.id_column.key))
+
+        await self._show(interaction)
@@ -0,0 +1,164 @@
+import os
+import re
+from typing import NamedTuple
+
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:
+    import sre_parse  # type: ignore
+
+from bot.enums import MatchKind
+
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+REPEAT_OPCODES = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+# Rough weights of the cost estimate. A pattern with a nested unbounded
+# quantifier or a backreference always costs at least EXPENSIVE_COST.
+ALTERNATION_COST = 50
+NESTED_QUANTIFIER_COST = 1000
+BACKREFERENCE_COST = 1000
+EXPENSIVE_COST = 1000
+# New match statements costing more than this are rejected
+MAX_PATTERN_COST = int(os.getenv("MAX_PATTERN_COST", 2500))
+
+
+class PatternAnalysis(NamedTuple):
+    kind: MatchKind
+    cost: int
+    # The literal text every match starts with, the whole text for literals
+    prefix: str
+
+
+def is_literal(pattern: str) -> bool:
+    """Returns whether a pattern only matches its own text"""
+
+    return REGEX_METACHARACTERS.isdisjoint(pattern)
+
+
+def _subpatterns(op, av) -> list:
+    if op in REPEAT_OPCODES:
+        return [av[2]]
+    elif op == sre_parse.SUBPATTERN:
+        return [av[-1]]
+    elif op == sre_parse.BRANCH:
+        return av[1]
+    elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+
+    return []
+
+
+def _has_repeat(subpattern) -> bool:
+    for op, av in subpattern:
+        if op in REPEAT_OPCODES and av[1] > 1:
+            return True
+        if any(_has_repeat(sub) for sub in _subpatterns(op, av)):
+            return True
+
+    return False
+
+
+def _count_hazards(subpattern) -> tuple[int, int, int]:
+    """Returns the number of nested unbounded quantifiers, the number of
+    backreferences and the deepest nesting of alternations in a parsed pattern
+    """
+
+    nested = backreferences = alternation_depth = 0
+
+    for op, av in subpattern:
+        if op == sre_parse.GROUPREF:
+            backreferences += 1
+        elif (
+            op in REPEAT_OPCODES
+            and av[1] == sre_parse.MAXREPEAT
+            and _has_repeat(av[2])
+        ):
+            nested += 1
+
+        depth = 0
+
+        for sub in _subpatterns(op, av):
+            sub_nested, sub_backreferences, sub_depth = _count_hazards(sub)
+            nested += sub_nested
+            backreferences += sub_backreferences
+            depth = max(depth, sub_depth)
+
+        if op == sre_parse.BRANCH:
+            depth += 1
+
+        alternation_depth = max(alternation_depth, depth)
+
+    return nested, backreferences, alternation_depth
+
+
+def _literal_prefix(parsed) -> tuple[str, bool]:
+    """Returns the leading literal text of a parsed pattern, and whether that's all there is to it"""
+
+    if parsed.state.flags & re.IGNORECASE:
+        return "", False
+
+    prefix = []
+
+    for op, av in parsed:
+        if op != sre_parse.LITERAL:
+            return "".join(prefix), False
+
+        prefix.append(chr(av))
+
+    return "".join(prefix), True
+
+
+def analyse_pattern(pattern: str) -> PatternAnalysis:
+    """Classifies a match statement and estimates how expensive it is to
+    evaluate. Raises ValueError if the pattern isn't a valid regex.
+    """
+
+    try:
+        re.compile(pattern)
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regex: {e}") from e
+
+    prefix, is_whole = _literal_prefix(parsed)
+
+    if is_whole:
+        kind = MatchKind.Literal
+    elif prefix:
+        kind = MatchKind.Prefix
+    else:
+        kind = MatchKind.Regex
+
+    nested, backreferences, alternation_depth = _count_hazards(parsed)
+    cost = (
+        len(pattern)
+        + ALTERNATION_COST * alternation_depth
+        + NESTED_QUANTIFIER_COST * nested
+        + BACKREFERENCE_COST * backreferences
+    )
+
+    return PatternAnalysis(kind, cost, prefix)
+
+
+def check_pattern(
+    pattern: str, max_cost: int = MAX_PATTERN_COST
+) -> PatternAnalysis:
+    """Analyses a match statement, raising ValueError if it's invalid or too expensive"""
+
+    analysis = analyse_pattern(pattern)
+
+    if analysis.cost > max_cost:
+        raise ValueError(
+            f"The match statement is too expensive to evaluate (cost {analysis.cost}, limit {max_cost}). "
+            "Avoid nesting quantifiers like `(a+)+`, backreferences and deeply nested alternations."
+        )
+
+    return analysis
+
+
+def literal_prefix(pattern: str) -> str:
+    """Returns the literal text that every match of a Literal or Prefix pattern starts with"""
+
+    if is_literal(pattern):
+        return pattern
+
+    return analyse_pattern(pattern).prefix
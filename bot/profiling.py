@@ -0,0 +1,139 @@
+import time
+import asyncio
+
+MAX_PROFILE_SECONDS = 600
+
+
+class Profiler:
+    """Attributes the time spent by the trigger pipeline to guilds and triggers
+    while a profiling window is open
+
+    Matching time is recorded per guild and listener, since a combined match
+    covers every trigger of a channel at once. Action execution time is
+    recorded per trigger. When no window is open, recording is a single
+    attribute check.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.started_at: float | None = None
+        self.stopped_at: float | None = None
+        self._stop_handle: asyncio.TimerHandle | None = None
+        self._reset()
+
+    def _reset(self):
+        # Guild ID: [events, matching seconds, actions, action seconds]
+        self.guilds: dict[int, list[float]] = {}
+        # Trigger ID: [guild ID, actions, action seconds]
+        self.triggers: dict[int, list[float]] = {}
+        # Listener: [events, matching seconds]
+        self.listeners: dict[str, list[float]] = {}
+
+    def start(self, duration: float):
+        """Clears the previous results and records for duration seconds, or until stopped"""
+
+        self.stop()
+        self._reset()
+        self.active = True
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop_handle = asyncio.get_running_loop().call_later(
+            min(duration, MAX_PROFILE_SECONDS), self.stop
+        )
+
+    def stop(self):
+        if self._stop_handle:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+
+        if self.active:
+            self.active = False
+            self.stopped_at = time.time()
+
+    def record_match(self, listener: str, guild_id: int, seconds: float):
+        if not self.active:
+            return
+
+        if (guild := self.guilds.get(guild_id)) is None:
+            guild = self.guilds[guild_id] = [0, 0.0, 0, 0.0]
+
+        guild[0] += 1
+        guild[1] += seconds
+
+        if (entry := self.listeners.get(listener)) is None:
+            entry = self.listeners[listener] = [0, 0.0]
+
+        entry[0] += 1
+        entry[1] += seconds
+
+    def record_action(self, guild_id: int, trigger_id: int, seconds: float):
+        if not self.active:
+            return
+
+        if (guild := self.guilds.get(guild_id)) is None:
+            guild = self.guilds[guild_id] = [0, 0.0, 0, 0.0]
+
+        guild[2] += 1
+        guild[3] += seconds
+
+        if (trigger := self.triggers.get(trigger_id)) is None:
+            trigger = self.triggers[trigger_id] = [guild_id, 0, 0.0]
+
+        trigger[1] += 1
+        trigger[2] += seconds
+
+    def summary(self, top: int | None = None) -> dict:
+        """Returns the guilds and triggers that took the most time, slowest first"""
+
+        guilds = sorted(
+            self.guilds.items(), key=lambda g: g[1][1] + g[1][3], reverse=True
+        )
+        triggers = sorted(
+            self.triggers.items(), key=lambda t: t[1][2], reverse=True
+        )
+        end = self.stopped_at or time.time()
+
+        return {
+            "started_at": self.started_at,
+            "seconds": (
+                round(end - self.started_at, 3) if self.started_at else 0
+            ),
+            "active": self.active,
+            "listeners": {
+                listener: {
+                    "events": events,
+                    "match_ms": round(seconds * 1000, 3),
+                }
+                for listener, (events, seconds) in self.listeners.items()
+            },
+            "guilds": [
+                {
+                    "guild_id": guild_id,
+                    "total_ms": round(
+                        (match_seconds + action_seconds) * 1000, 3
+                    ),
+                    "events": events,
+                    "match_ms": round(match_seconds * 1000, 3),
+                    "actions": actions,
+                    "action_ms": round(action_seconds * 1000, 3),
+                }
+                for guild_id, (
+                    events,
+                    match_seconds,
+                    actions,
+                    action_seconds,
+                ) in guilds[:top]
+            ],
+            "triggers": [
+                {
+                    "trigger_id": trigger_id,
+                    "guild_id": guild_id,
+                    "actions": actions,
+                    "action_ms": round(seconds * 1000, 3),
+                }
+                for trigger_id, (guild_id, actions, seconds) in triggers[:top]
+            ],
+        }
+
+
+profiler = Profiler()
@@ -0,0 +1,88 @@
+import re
+import gzip
+import json
+import time
+import zlib
+from typing import Iterator
+
+REDACTION_MODES = ("none", "mask", "drop")
+FLUSH_INTERVAL = 1.0
+
+_LETTERS = re.compile(r"[^\W\d_]")
+_DIGITS = re.compile(r"\d")
+
+
+def redact(content: str, mode: str) -> str | None:
+    """Hides message content: "mask" keeps its length and shape, replacing letters
+    with x and digits with 0, "drop" removes it altogether
+    """
+
+    if mode == "none":
+        return content
+    elif mode == "mask":
+        return _DIGITS.sub("0", _LETTERS.sub("x", content))
+
+    return None
+
+
+class EventRecorder:
+    """Appends gateway events to a gzip-compressed JSON Lines file
+
+    Every time the recorder is opened, a new gzip member is appended to the
+    file, so a capture can be resumed without rewriting what's already there.
+    """
+
+    def __init__(self, path: str, redaction: str = "none"):
+        if redaction not in REDACTION_MODES:
+            raise Exception(
+                f"Unknown redaction mode {redaction!r}, expected one of {REDACTION_MODES}"
+            )
+
+        self.path = path
+        self.redaction = redaction
+        self.recorded = 0
+        self._file = None
+        self._started_at = 0.0
+        self._flushed_at = 0.0
+
+    def open(self):
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._started_at = self._flushed_at = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, event_type: str, **fields):
+        if self._file is None:
+            return
+
+        now = time.monotonic()
+        fields["t"] = event_type
+        fields["ts"] = round(now - self._started_at, 4)
+
+        if "content" in fields:
+            fields["content"] = redact(fields["content"], self.redaction)
+
+        self._file.write(json.dumps(fields, separators=(",", ":")) + "\n")
+        self.recorded += 1
+
+        # Bounds how much of the capture is lost if the process dies
+        if now - self._flushed_at >= FLUSH_INTERVAL:
+            self._file.flush()
+            self._flushed_at = now
+
+
+def read_events(path: str) -> Iterator[dict]:
+    """Yields the events of a capture in order, stopping at a truncated tail left by a crash"""
+
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except (EOFError, zlib.error):
+            return
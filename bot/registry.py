@@ -0,0 +1,322 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from sqlalchemy import Column
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.future import select
+
+from bot.db import fetch_rows, models
+from bot.enums import TriggerType
+from bot.records import CompiledAction, CompiledTrigger
+
+REACTION_TRIGGER_TYPES = (TriggerType.ReactionAdd, TriggerType.ReactionRemove)
+
+ReactionKey = tuple[int, TriggerType, int, int]
+
+
+def watched_id(trigger: CompiledTrigger) -> int | None:
+    """Returns the ID of the channel or message an event must come from to possibly match a trigger"""
+
+    if trigger.type == TriggerType.Message:
+        return trigger.channel_id
+    elif trigger.type in REACTION_TRIGGER_TYPES:
+        return trigger.message_id
+
+    return None
+
+
+def reaction_key(trigger: CompiledTrigger) -> ReactionKey:
+    return (
+        trigger.guild_id,
+        trigger.type,
+        trigger.channel_id,  # type: ignore
+        trigger.message_id,  # type: ignore
+    )
+
+
+class TriggerRegistry:
+    """Resident copy of every trigger and its actions, grouped by guild and trigger type"""
+
+    def __init__(self):
+        self._triggers: dict[
+            tuple[int, TriggerType], dict[int, CompiledTrigger]
+        ] = {}
+        self._actions: dict[int, dict[int, CompiledAction]] = {}
+        self._trigger_keys: dict[int, tuple[int, TriggerType]] = {}
+        self._versions: dict[tuple[int, TriggerType], int] = {}
+
+        # Reaction triggers are also indexed by the message they watch and
+        # their emoji, with emoji-less triggers stored under the None key.
+        self._reactions: dict[
+            ReactionKey, dict[str | int | None, dict[int, CompiledTrigger]]
+        ] = {}
+
+        # Reference counts of (trigger type, channel or message ID) pairs
+        # that have at least one trigger, used to drop events before any I/O.
+        self._watched: Counter[tuple[TriggerType, int]] = Counter()
+
+        # Sorted trigger IDs of each guild, searched by autocomplete
+        self._guild_ids: dict[int, list[int]] = {}
+
+        # Only set when running as one of several sharded processes
+        self.shard_ids: set[int] | None = None
+        self.shard_count = 1
+
+    def set_shards(self, shard_ids: list[int], shard_count: int):
+        """Restricts the registry to guilds that belong to the given shards"""
+
+        self.shard_ids = set(shard_ids)
+        self.shard_count = shard_count
+
+    def _shard_filter(self, guild_id: Column) -> ColumnElement[bool]:
+        # Same formula Discord uses to assign guilds to shards
+        shard_id = guild_id.op(">>")(22) % self.shard_count
+        return shard_id.in_(self.shard_ids)  # type: ignore
+
+    def owns_guild(self, guild_id: int) -> bool:
+        if self.shard_ids is None:
+            return True
+
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    async def load(self):
+        """Loads all triggers and actions from the database, replacing anything already cached"""
+
+        trigger_query = select(models.Trigger.__table__)
+        action_query = select(models.Action.__table__)
+
+        if self.shard_ids is not None:
+            trigger_query = trigger_query.where(
+                self._shard_filter(models.Trigger.guild_id)
+            )
+            action_query = action_query.where(
+                self._shard_filter(models.Action.guild_id)
+            )
+
+        trigger_rows = await fetch_rows(trigger_query)
+        action_rows = await fetch_rows(action_query)
+
+        self.clear()
+
+        for row in trigger_rows:
+            self.add_trigger(row)
+
+        for row in action_rows:
+            self.add_action(row)
+
+    def clear(self):
+        for key in self._triggers:
+            self._bump_version(key)
+
+        self._triggers.clear()
+        self._actions.clear()
+        self._trigger_keys.clear()
+        self._reactions.clear()
+        self._watched.clear()
+        self._guild_ids.clear()
+
+    def add_trigger(self, model: models.Trigger | Row):
+        """Adds or replaces a trigger, given as a model instance or a row of the triggers table"""
+
+        if not self.owns_guild(model.guild_id):
+            return
+
+        trigger = CompiledTrigger.from_model(model)
+        key = (trigger.guild_id, trigger.type)
+        trigger_id = trigger.id
+
+        if trigger_id in self._trigger_keys:
+            self.remove_trigger(trigger_id, keep_actions=True)
+
+        self._triggers.setdefault(key, {})[trigger_id] = trigger
+        insort(self._guild_ids.setdefault(trigger.guild_id, []), trigger_id)
+        self._actions.setdefault(trigger_id, {})
+        self._trigger_keys[trigger_id] = key
+        self._bump_version(key)
+
+        if (target_id := watched_id(trigger)) is not None:
+            self._watched[(trigger.type, target_id)] += 1
+
+        if trigger.type in REACTION_TRIGGER_TYPES:
+            self._reactions.setdefault(reaction_key(trigger), {}).setdefault(
+                trigger.emoji, {}
+            )[trigger_id] = trigger
+
+    def remove_trigger(self, trigger_id: int, keep_actions: bool = False):
+        """Removes a trigger along with all of its actions"""
+
+        key = self._trigger_keys.pop(trigger_id, None)
+
+        if not keep_actions:
+            self._actions.pop(trigger_id, None)
+
+        if key is None:
+            return
+
+        guild_triggers = self._triggers[key]
+        trigger = guild_triggers.pop(trigger_id, None)
+        self._bump_version(key)
+
+        if trigger is not None:
+            self._unwatch(trigger)
+            self._remove_guild_id(trigger)
+
+            if trigger.type in REACTION_TRIGGER_TYPES:
+                self._remove_reaction_trigger(trigger)
+
+        if not guild_triggers:
+            del self._triggers[key]
+
+    def _unwatch(self, trigger: CompiledTrigger):
+        if (target_id := watched_id(trigger)) is None:
+            return
+
+        watched_key = (trigger.type, target_id)
+        self._watched[watched_key] -= 1
+
+        if self._watched[watched_key] <= 0:
+            del self._watched[watched_key]
+
+    def _remove_guild_id(self, trigger: CompiledTrigger):
+        guild_ids = self._guild_ids.get(trigger.guild_id, [])
+        index = bisect_left(guild_ids, trigger.id)
+
+        if index < len(guild_ids) and guild_ids[index] == trigger.id:
+            del guild_ids[index]
+
+        if not guild_ids:
+            self._guild_ids.pop(trigger.guild_id, None)
+
+    def _remove_reaction_trigger(self, trigger: CompiledTrigger):
+        key = reaction_key(trigger)
+        emoji_buckets = self._reactions.get(key, {})
+
+        if (bucket := emoji_buckets.get(trigger.emoji)) is not None:
+            bucket.pop(trigger.id, None)
+
+            if not bucket:
+                del emoji_buckets[trigger.emoji]
+
+        if not emoji_buckets:
+            self._reactions.pop(key, None)
+
+    def _bump_version(self, key: tuple[int, TriggerType]):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get_version(self, guild_id: int, trigger_type: TriggerType) -> int:
+        """Returns a counter that changes whenever triggers of a certain type in a guild are added or removed"""
+
+        return self._versions.get((guild_id, trigger_type), 0)
+
+    def add_action(self, model: models.Action | Row):
+        """Adds or replaces an action, given as a model instance or a row of the actions table"""
+
+        if model.trigger_id not in self._actions:
+            return
+
+        try:
+            action = CompiledAction.from_model(model)
+        except ValueError as e:
+            print(f"Skipping action {model.id}, invalid message content: {e}")
+            return
+
+        self._actions[action.trigger_id][action.id] = action
+
+    def remove_action(self, trigger_id: int, action_id: int):
+        if trigger_actions := self._actions.get(trigger_id):
+            trigger_actions.pop(action_id, None)
+
+    def watches_guild(self, guild_id: int, trigger_type: TriggerType) -> bool:
+        """Returns whether a guild has any triggers of a certain type"""
+
+        return (guild_id, trigger_type) in self._triggers
+
+    def watches(self, trigger_type: TriggerType, target_id: int) -> bool:
+        """Returns whether any trigger of a certain type watches a channel (Message) or message (reactions)"""
+
+        return (trigger_type, target_id) in self._watched
+
+    def get_trigger(self, trigger_id: int) -> CompiledTrigger | None:
+        if key := self._trigger_keys.get(trigger_id):
+            return self._triggers[key].get(trigger_id)
+
+        return None
+
+    def get_triggers(
+        self, guild_id: int, trigger_type: TriggerType
+    ) -> list[CompiledTrigger]:
+        """Returns all triggers of a certain type in a guild"""
+
+        if guild_triggers := self._triggers.get((guild_id, trigger_type)):
+            return list(guild_triggers.values())
+
+        return []
+
+    def search_triggers(
+        self, guild_id: int, prefix: str, limit: int = 25
+    ) -> list[CompiledTrigger]:
+        """Returns up to limit triggers in a guild whose ID starts with prefix,
+        shortest IDs first, or the newest triggers if the prefix is empty
+        """
+
+        guild_ids = self._guild_ids.get(guild_id, [])
+        found: list[int] = []
+
+        if not prefix:
+            found = guild_ids[-limit:][::-1]
+        # IDs never start with a zero
+        elif prefix.isdecimal() and not prefix.startswith("0"):
+            start = int(prefix)
+            end = start + 1
+
+            # IDs starting with the prefix and k more digits form
+            # the range [prefix * 10^k, (prefix + 1) * 10^k).
+            while guild_ids and start <= guild_ids[-1] and len(found) < limit:
+                index = bisect_left(guild_ids, start)
+
+                while (
+                    index < len(guild_ids)
+                    and guild_ids[index] < end
+                    and len(found) < limit
+                ):
+                    found.append(guild_ids[index])
+                    index += 1
+
+                start, end = start * 10, end * 10
+
+        return [self.get_trigger(trigger_id) for trigger_id in found]  # type: ignore
+
+    def get_reaction_triggers(
+        self,
+        guild_id: int,
+        trigger_type: TriggerType,
+        channel_id: int,
+        message_id: int,
+        emoji: str | int | None,
+    ) -> list[CompiledTrigger]:
+        """Returns all reaction triggers watching a message for a certain emoji, including those watching all emojis"""
+
+        emoji_buckets = self._reactions.get(
+            (guild_id, trigger_type, channel_id, message_id)
+        )
+
+        if not emoji_buckets:
+            return []
+
+        triggers = [
+            *emoji_buckets.get(emoji, {}).values(),
+            *emoji_buckets.get(None, {}).values(),
+        ]
+        triggers.sort(key=lambda t: t.id)
+        return triggers
+
+    def get_actions(self, trigger_id: int) -> list[CompiledAction]:
+        """Returns all actions associated with a trigger"""
+
+        if trigger_actions := self._actions.get(trigger_id):
+            return list(trigger_actions.values())
+
+        return []
+
+
+trigger_registry = TriggerRegistry()
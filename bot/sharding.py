@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import multiprocessing
+from multiprocessing.process import BaseProcess
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """Splits shard IDs into contiguous ranges, one per process"""
+
+    processes = max(1, min(processes, shard_count))
+    per_process, remainder = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+
+    for i in range(processes):
+        end = start + per_process + (1 if i < remainder else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+def run_worker(token: str):
+    """Entry point of a worker process, which reads its shards from the environment"""
+
+    import bot
+
+    bot.main(token)
+
+
+class ShardLauncher:
+    """Runs the bot as several processes, each handling a range of shards, and restarts any that exit"""
+
+    def __init__(self, token: str, shard_count: int, processes: int):
+        self.token = token
+        self.shard_count = shard_count
+        self.shard_ranges = split_shards(shard_count, processes)
+        self.metrics_port = os.getenv("METRICS_PORT")
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: dict[int, BaseProcess] = {}
+        self._started_at: dict[int, float] = {}
+        self._restarts: dict[int, int] = {}
+        self._restart_at: dict[int, float] = {}
+
+    def _start_worker(self, index: int):
+        shard_ids = self.shard_ranges[index]
+
+        # Spawned processes copy the environment when they start, which is
+        # how each worker's bot learns which shards it should connect.
+        os.environ["SHARD_IDS"] = json.dumps(shard_ids)
+        os.environ["SHARD_COUNT"] = str(self.shard_count)
+
+        # Each worker serves its own metrics, on consecutive ports
+        if self.metrics_port:
+            os.environ["METRICS_PORT"] = str(int(self.metrics_port) + index)
+
+        worker = self._context.Process(
+            target=run_worker,
+            args=(self.token,),
+            name=f"shards-{shard_ids[0]}-{shard_ids[-1]}",
+        )
+        worker.start()
+        self._workers[index] = worker
+        self._started_at[index] = time.monotonic()
+        print(f"Started worker {worker.name} (pid {worker.pid})")
+
+    def run(self):
+        for index in range(len(self.shard_ranges)):
+            self._start_worker(index)
+
+        try:
+            while True:
+                time.sleep(1)
+                self._supervise()
+        except KeyboardInterrupt:
+            print("Shutting down workers...")
+            self.stop()
+
+    def _supervise(self):
+        now = time.monotonic()
+
+        for index, worker in list(self._workers.items()):
+            if worker.is_alive():
+                continue
+
+            if index in self._restart_at:
+                if now >= self._restart_at[index]:
+                    del self._restart_at[index]
+                    self._start_worker(index)
+
+                continue
+
+            # Back off exponentially, unless the worker had been running fine for a while
+            if now - self._started_at[index] > 60:
+                self._restarts[index] = 0
+
+            restarts = self._restarts.get(index, 0)
+            delay = min(2**restarts, 60)
+            self._restarts[index] = restarts + 1
+            self._restart_at[index] = now + delay
+
+            print(
+                f"Worker {worker.name} exited with code {worker.exitcode}, restarting in {delay}s"
+            )
+
+    def stop(self):
+        for worker in self._workers.values():
+            worker.terminate()
+
+        for worker in self._workers.values():
+            worker.join()
@@ -0,0 +1,244 @@
+import json
+import uuid
+import asyncio
+import traceback
+
+import asyncpg
+from sqlalchemy import func
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.future import select
+
+from bot import db
+from bot.db import fetch_rows, models
+from bot.registry import trigger_registry
+
+CHANNEL = "trigger_changes"
+
+
+class TriggerSync:
+    """Keeps the trigger registry of every bot process in sync using Postgres LISTEN/NOTIFY
+
+    Commands apply their changes to the local registry and then publish a small
+    notification with the guild, trigger and action IDs. Every other process
+    applies the same change incrementally, fetching only the affected rows.
+    Changes are applied one at a time in the order they were received, so a
+    change can't overtake an earlier one that is still fetching rows.
+
+    Listening starts before the registry is loaded, and changes received while
+    it loads are only applied once it has, so that none made in the meantime
+    are missed or wiped out by the load.
+    """
+
+    def __init__(self):
+        self.process_id = uuid.uuid4().hex
+        self._connection: asyncpg.Connection | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._changes: asyncio.Queue[dict] | None = None
+        self._consumer_task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return db.get_engine().dialect.name == "postgresql"
+
+    async def start(self):
+        """Loads the trigger registry and starts listening for changes made by other processes
+
+        Listening is only supported on Postgres, elsewhere the registry is just loaded.
+        """
+
+        if not self.enabled:
+            await trigger_registry.load()
+            return
+
+        # Changes received during the load wait in the queue until it's done
+        self._changes = asyncio.Queue()
+        url = db.get_engine().url.set(drivername="postgresql")
+        self._connection = await asyncpg.connect(
+            url.render_as_string(hide_password=False)
+        )
+        self._connection.add_termination_listener(self._on_termination)
+        await self._connection.add_listener(CHANNEL, self._on_notification)
+
+        await trigger_registry.load()
+        self._consumer_task = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+        await self._stop_consumer()
+        await self._close_connection()
+
+    async def _stop_consumer(self):
+        if task := self._consumer_task:
+            self._consumer_task = None
+            task.cancel()
+
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _close_connection(self):
+        # Cleared first so that the termination listener doesn't reconnect
+        if connection := self._connection:
+            self._connection = None
+            await connection.close()
+
+    async def trigger_added(self, trigger: models.Trigger):
+        trigger_registry.add_trigger(trigger)
+        await self._publish("trigger_add", trigger.guild_id, trigger.id)  # type: ignore
+
+    async def trigger_removed(self, guild_id: int, trigger_id: int):
+        trigger_registry.remove_trigger(trigger_id)
+        await self._publish("trigger_remove", guild_id, trigger_id)
+
+    async def action_added(self, action: models.Action):
+        trigger_registry.add_action(action)
+        await self._publish(
+            "action_add", action.guild_id, action.trigger_id, action.id  # type: ignore
+        )
+
+    async def action_removed(self, action: models.Action):
+        trigger_registry.remove_action(action.trigger_id, action.id)  # type: ignore
+        await self._publish(
+            "action_remove", action.guild_id, action.trigger_id, action.id  # type: ignore
+        )
+
+    async def triggers_imported(
+        self, guild_id: int, triggers: list[models.Trigger]
+    ):
+        """Adds a batch of triggers with their actions, publishing a single notification for all of them"""
+
+        for trigger in triggers:
+            trigger_registry.add_trigger(trigger)
+
+            for action in trigger.actions:
+                trigger_registry.add_action(action)
+
+        await self._publish("guild_import", guild_id)
+
+    async def _publish(
+        self,
+        operation: str,
+        guild_id: int,
+        trigger_id: int | None = None,
+        action_id: int | None = None,
+    ):
+        if not self.enabled:
+            return
+
+        payload = json.dumps(
+            {
+                "origin": self.process_id,
+                "operation": operation,
+                "guild_id": guild_id,
+                "trigger_id": trigger_id,
+                "action_id": action_id,
+            }
+        )
+
+        async with db.get_engine().begin() as connection:
+            await connection.execute(select(func.pg_notify(CHANNEL, payload)))
+
+    def _on_notification(self, _connection, _pid, _channel, payload: str):
+        change = json.loads(payload)
+
+        if change["origin"] != self.process_id and self._changes is not None:
+            self._changes.put_nowait(change)
+
+    async def _consume(self):
+        changes: asyncio.Queue[dict] = self._changes  # type: ignore
+
+        while True:
+            await self.apply(await changes.get())
+
+    async def apply(self, change: dict):
+        """Applies a change published by another process to the local registry"""
+
+        # Other shards' guilds are never loaded, so there's nothing to fetch
+        if not trigger_registry.owns_guild(change["guild_id"]):
+            return
+
+        operation = change["operation"]
+        trigger_id: int = change["trigger_id"]
+
+        try:
+            if operation == "guild_import":
+                await self._fetch_guild(change["guild_id"])
+            elif operation == "trigger_add":
+                await self._fetch_trigger(trigger_id)
+            elif operation == "trigger_remove":
+                trigger_registry.remove_trigger(trigger_id)
+            elif operation == "action_add":
+                query = select(models.Action.__table__).where(
+                    models.Action.id == change["action_id"]
+                )
+
+                for row in await fetch_rows(query):
+                    trigger_registry.add_action(row)
+            elif operation == "action_remove":
+                trigger_registry.remove_action(trigger_id, change["action_id"])
+        except Exception:
+            print(f"Failed to apply trigger change {change}:")
+            traceback.print_exc()
+
+    async def _fetch_trigger(self, trigger_id: int):
+        trigger_query = select(models.Trigger.__table__).where(
+            models.Trigger.id == trigger_id
+        )
+        action_query = select(models.Action.__table__).where(
+            models.Action.trigger_id == trigger_id
+        )
+
+        for row in await fetch_rows(trigger_query):
+            trigger_registry.add_trigger(row)
+
+        for row in await fetch_rows(action_query):
+            trigger_registry.add_action(row)
+
+    async def _fetch_guild(self, guild_id: int):
+        """Adds every trigger and action of a guild, replacing any that are already loaded"""
+
+        trigger_query = select(models.Trigger.__table__).where(
+            models.Trigger.guild_id == guild_id
+        )
+        action_query = select(models.Action.__table__).where(
+            models.Action.guild_id == guild_id
+        )
+
+        for row in await fetch_rows(trigger_query):
+            trigger_registry.add_trigger(row)
+
+        for row in await fetch_rows(action_query):
+            trigger_registry.add_action(row)
+
+    def _on_termination(self, _connection):
+        if self._connection is not None:
+            self._connection = None
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Reconnects after losing the listener connection, reloading everything that may have been missed"""
+
+        # Changes still queued are covered by the reload, which mustn't
+        # run while the consumer is applying them.
+        await self._stop_consumer()
+        delay = 1
+
+        while True:
+            try:
+                await self.start()
+                print("Reconnected to trigger change notifications")
+                return
+            except (OSError, asyncpg.PostgresError, DBAPIError) as e:
+                print(
+                    f"Failed to reconnect to trigger change notifications: {e!r}"
+                )
+                await self._close_connection()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+
+trigger_sync = TriggerSync()
@@ -0,0 +1,135 @@
+import asyncio
+import inspect
+from string import Formatter
+from typing import Any, Callable
+
+from bot.enums import TriggerType
+
+_formatter = Formatter()
+CONVERSIONS = (None, "r", "s", "a")
+
+
+class TemplateError(ValueError):
+    """Raised for a template that parses but can't be rendered, with a message that can be shown to users"""
+
+
+class UnsafeFieldError(TemplateError):
+    """Raised for template fields that look up attributes or items, which could reach
+    any object reachable from a parameter (e.g. the bot's HTTP client and token)
+    """
+
+
+class CompiledTemplate:
+    """A MessageSend template parsed once into literal text and field tokens"""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.tokens: list[tuple[str, str | None, bool, str, str | None]] = []
+        self.fields: set[str] = set()
+
+        # Raises ValueError if the template is malformed
+        for literal, field_name, format_spec, conversion in _formatter.parse(
+            template
+        ):
+            if field_name is None:
+                self.tokens.append((literal, None, True, "", None))
+                continue
+
+            if "." in field_name or "[" in field_name:
+                raise UnsafeFieldError(
+                    f"`{{{field_name}}}` isn't allowed, parameters can't be followed by `.` or `[`"
+                )
+
+            if conversion not in CONVERSIONS:
+                raise TemplateError(
+                    f"`{{{field_name}!{conversion}}}` isn't allowed, the only conversions are `!r`, `!s` and `!a`"
+                )
+
+            is_plain = not format_spec and conversion is None
+            self.tokens.append(
+                (literal, field_name, is_plain, format_spec or "", conversion)
+            )
+            self.fields.add(field_name)
+
+            if "{" in (format_spec or ""):
+                self.fields |= CompiledTemplate(format_spec).fields
+
+    def check(self):
+        """Renders the template with sample text for every field, raising TemplateError if that fails"""
+
+        try:
+            self.render({name: name for name in self.fields})
+        except (ValueError, TypeError) as e:
+            raise TemplateError(
+                f"That message content can't be rendered: {e}"
+            ) from None
+
+    def render(self, values: dict[str, Any]) -> str:
+        """Substitutes the template's fields, which must all be present in values"""
+
+        parts = []
+
+        for (
+            literal,
+            field_name,
+            is_plain,
+            format_spec,
+            conversion,
+        ) in self.tokens:
+            parts.append(literal)
+
+            if field_name is None:
+                continue
+            elif is_plain:
+                parts.append(str(values[field_name]))
+            else:
+                value, _ = _formatter.get_field(field_name, (), values)
+                value = _formatter.convert_field(value, conversion)  # type: ignore
+
+                if "{" in format_spec:
+                    format_spec = _formatter.vformat(format_spec, (), values)
+
+                parts.append(format(value, format_spec))
+
+        return "".join(parts)
+
+
+class TemplateContext:
+    """Dynamic parameters of a trigger event, each resolved only when a template references it"""
+
+    def __init__(
+        self, trigger_type: TriggerType, **resolvers: Callable[[], Any]
+    ):
+        self.trigger_type = trigger_type
+        self._resolvers = resolvers
+        self._values: dict[str, Any] = {}
+
+    async def get(self, name: str) -> Any:
+        if name in self._values:
+            value = self._values[name]
+            return await value if isinstance(value, asyncio.Future) else value
+
+        defaults: dict = self.trigger_type.value
+
+        if resolver := self._resolvers.get(name):
+            value = resolver()
+
+            if inspect.isawaitable(value):
+                # Store the pending result so that concurrent actions
+                # share a single API call instead of making their own.
+                future = asyncio.ensure_future(value)
+                self._values[name] = future
+                value = await future
+        elif name in defaults:
+            value = defaults[name]
+        else:
+            raise KeyError(name)
+
+        self._values[name] = value
+        return value
+
+    async def render(self, template: CompiledTemplate) -> str:
+        """Renders a template, resolving only the parameters it uses"""
+
+        values = {name: await self.get(name) for name in template.fields}
+        return template.render(values)
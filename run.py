@@ -5,7 +5,12 @@ if __name__ == "__main__":
     load_dotenv()
     token = os.getenv("TOKEN")
 
-    if token:
+    if token and (shard_count := os.getenv("SHARD_COUNT")):
+        from bot.sharding import ShardLauncher
+
+        processes = int(os.getenv("SHARD_PROCESSES", os.cpu_count() or 1))
+        ShardLauncher(token, int(shard_count), processes).run()
+    elif token:
         import bot
 
         bot.main(token)